@@ -0,0 +1,25 @@
+# app/core/auth.py
+
+from fastapi import HTTPException, Request
+from app.core.executor import run_blocking
+from app.core.sessions import admin_sessions
+from app.core.utils import verify_admin
+from typing import Optional
+
+async def require_admin(request: Request, admin_id: Optional[str] = None) -> str:
+    """
+    Return the id of the admin making the request. A Bearer session token from
+    /admin/login is checked locally; a bare admin_id is still accepted for older
+    clients, at the cost of a profile lookup.
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        claims = admin_sessions.verify(token)
+        if claims is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired session token")
+        return claims["sub"]
+
+    if admin_id and await run_blocking(verify_admin, admin_id) is True:
+        return admin_id
+
+    raise HTTPException(status_code=403, detail="Unauthorized")
@@ -0,0 +1,123 @@
+# app/core/board.py
+
+from app.core.db import db
+from app.core.images import image_store
+from app.core.utils import admin_listeners, time_elasped_string
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+ADMIN_AVATAR_DIR = os.getenv("ADMIN_AVATAR_DIR", ".")
+# Thumbnail size used on the board, one of images.THUMBNAIL_SIZES
+BOARD_AVATAR_SIZE = "128"
+# Firestore is re-read at most this often unless a message or admin changes
+BOARD_TTL = float(os.getenv("ADMIN_BOARD_TTL", 300))
+# "time ago" strings are re-rendered from memory this often
+BOARD_RENDER_TTL = float(os.getenv("ADMIN_BOARD_RENDER_TTL", 15))
+
+BADGE_TYPES = {
+    "owner": "danger",
+    "dev": "danger",
+    "admin": "primary",
+    "moderator": "primary"
+}
+
+def badge(titles: List[str]) -> List[Dict[str, str]]:
+    return [{"content": title, "badgeType": BADGE_TYPES.get(title, "success")} for title in titles]
+
+def avatar_path(admin_id: str) -> Path:
+    return Path(ADMIN_AVATAR_DIR) / f"admin_{admin_id}.png"
+
+class AdminBoard:
+    """
+    Materialized view of /admin/get-messages. The messages and their authors
+    are loaded from Firestore only after invalidate() or once `ttl` expires;
+    the JSON body and its ETag are rendered from memory every `render_ttl`
+    seconds so the relative times stay current.
+    """
+
+    def __init__(self, ttl: float, render_ttl: float):
+        self.ttl = ttl
+        self.render_ttl = render_ttl
+        self.loads = 0
+        self.renders = 0
+        self._rows: Optional[List[dict]] = None
+        self._loaded_at = 0.0
+        self._body: Optional[bytes] = None
+        self._etag = ""
+        self._rendered_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, *_):
+        self._generation += 1
+        self._loaded_at = 0.0
+
+    def _stale(self, now: float) -> bool:
+        return self._rows is None or self._loaded_at == 0.0 or now - self._loaded_at >= self.ttl
+
+    def _load(self) -> List[dict]:
+        messages = list(db.collection("admin_messages").stream())
+        refs = [db.collection("admins").document(doc.id) for doc in messages]
+        admins = {snapshot.id: snapshot.to_dict() for snapshot in db.get_all(refs) if snapshot.exists} if refs else {}
+
+        rows = []
+        for doc in messages:
+            admin = admins.get(doc.id)
+            if admin is None or not admin.get("isActive") or admin.get("probation"):
+                continue
+
+            obj = doc.to_dict()
+            avatar = image_store.publish(avatar_path(doc.id))
+            rows.append({
+                "name": admin["username"],
+                "badges": badge(admin.get("badges", [])),
+                "imageSource": avatar[BOARD_AVATAR_SIZE] if avatar else None,
+                "assentColor": admin.get("color", "#21b4b4"),
+                "playerDetail": admin.get("role", "admin"),
+                "messageContent": obj.get("message"),
+                "time": obj.get("time")
+            })
+        return rows
+
+    def _render(self, rows: List[dict]):
+        pages = [{**{key: value for key, value in row.items() if key != "time"}, "timeDiff": time_elasped_string(row["time"])} for row in rows]
+        self._body = json.dumps({"page": pages, "pageCount": len(pages)}).encode()
+        self._etag = '"' + hashlib.sha1(self._body).hexdigest() + '"'
+        self._rendered_at = time.monotonic()
+        self.renders += 1
+
+    def get(self) -> Tuple[bytes, str]:
+        now = time.monotonic()
+        if not self._stale(now) and now - self._rendered_at < self.render_ttl:
+            return self._body, self._etag
+
+        with self._lock:
+            now = time.monotonic()
+            if self._stale(now):
+                generation = self._generation
+                rows = self._load()
+                self.loads += 1
+                self._rows = rows
+                # A change that raced the load forces another load on the next request
+                self._loaded_at = now if generation == self._generation else 0.0
+                self._render(rows)
+            elif now - self._rendered_at >= self.render_ttl:
+                self._render(self._rows)
+
+            return self._body, self._etag
+
+    def stats(self) -> dict:
+        return {
+            "messages": len(self._rows) if self._rows is not None else None,
+            "loads": self.loads,
+            "renders": self.renders,
+            "age_seconds": time.monotonic() - self._loaded_at if self._loaded_at else None
+        }
+
+admin_board = AdminBoard(ttl=BOARD_TTL, render_ttl=BOARD_RENDER_TTL)
+admin_listeners.append(admin_board.invalidate)
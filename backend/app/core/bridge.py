@@ -0,0 +1,229 @@
+# app/core/bridge.py
+
+from typing import Dict, Optional, Tuple
+import asyncio
+import bisect
+import json
+import time
+import uuid
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+class PluginUnavailable(Exception):
+    pass
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def stats(self) -> dict:
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "avg_ms": self.total_ms / self.count if self.count else 0.0,
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+class PluginBridge:
+    """
+    Request/response multiplexer over the Minecraft plugin websocket.
+
+    At most `max_in_flight` requests wait on the plugin at once; callers that
+    cannot get a slot within `acquire_timeout` seconds fail straight away. When
+    the plugin disconnects or is replaced, every waiting request fails at once
+    instead of sitting out its timeout.
+
+    Liveness is checked with WebSocket protocol pings sent by the server (see
+    run.py); a plugin that stops answering them is disconnected, which ends
+    the /ws receive loop and detaches it here.
+    """
+
+    def __init__(self, max_in_flight: int, timeout: float, acquire_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.ws = None
+        self.connected_at: Optional[float] = None
+        self.last_seen: Optional[float] = None
+        self.rejected = 0
+        self.timeouts = 0
+        self.aborted = 0
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self._pending: Dict[str, Tuple[asyncio.Future, str, float]] = {}
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    @property
+    def connected(self) -> bool:
+        return self.ws is not None
+
+    async def attach(self, websocket):
+        previous = self.ws
+        self.ws = websocket
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+
+        if previous is not None and previous is not websocket:
+            self._fail_pending("Plugin reconnected")
+            try:
+                await previous.close()
+            except Exception:
+                pass
+
+    def detach(self, websocket):
+        if self.ws is not websocket:
+            return
+
+        self.ws = None
+        self._fail_pending("Plugin disconnected")
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def resolve(self, message: dict) -> bool:
+        entry = self._pending.pop(message.get("request_id"), None)
+        if entry is None:
+            return False
+
+        fut, action, start = entry
+        self.latency.setdefault(action, LatencyHistogram()).observe((time.perf_counter() - start) * 1000)
+        if not fut.done():
+            fut.set_result(message.get("response"))
+        return True
+
+    def _fail_pending(self, reason: str):
+        pending, self._pending = self._pending, {}
+        for fut, _, _ in pending.values():
+            if not fut.done():
+                self.aborted += 1
+                fut.set_exception(PluginUnavailable(reason))
+
+    async def request(self, request_data: dict, timeout: Optional[float] = None):
+        if self.ws is None:
+            raise PluginUnavailable("No plugin connected")
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PluginUnavailable("Too many pending plugin requests")
+
+        request_id = str(uuid.uuid4())
+        try:
+            ws = self.ws
+            if ws is None:
+                raise PluginUnavailable("No plugin connected")
+
+            fut = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = (fut, request_data.get("action", "unknown"), time.perf_counter())
+            await ws.send_text(json.dumps({**request_data, "request_id": request_id}))
+
+            try:
+                return await asyncio.wait_for(fut, timeout=timeout or self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise Exception("Request timed out")
+
+        finally:
+            self._pending.pop(request_id, None)
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "connected_at": self.connected_at,
+            "last_seen_seconds": time.monotonic() - self.last_seen if self.last_seen is not None else None,
+            "in_flight": len(self._pending),
+            "max_in_flight": self.max_in_flight,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "aborted": self.aborted,
+            "latency": {action: histogram.stats() for action, histogram in self.latency.items()}
+        }
+
+class PluginReadCache:
+    """
+    Per-action cache for read-only plugin requests. Concurrent misses for the
+    same action share one in-flight request; an entry older than its TTL but
+    younger than TTL + `stale_for` is served as-is while one background refresh
+    runs, so the plugin sees at most one query per action per TTL.
+    """
+
+    def __init__(self, bridge: PluginBridge, ttls: Dict[str, float], stale_for: float):
+        self.bridge = bridge
+        self.ttls = ttls
+        self.stale_for = stale_for
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: Dict[str, Tuple[float, object]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._generation = 0
+
+    async def get(self, action: str):
+        entry = self._entries.get(action)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttls[action]:
+                self.hits += 1
+                return entry[1]
+            if age < self.ttls[action] + self.stale_for:
+                self.stale_hits += 1
+                self._refresh(action)
+                return entry[1]
+
+        self.misses += 1
+        # shield: a caller going away must not cancel the request other callers are sharing
+        return await asyncio.shield(self._refresh(action))
+
+    def invalidate(self, action: Optional[str] = None):
+        self._generation += 1
+        # Reads already in flight may answer from before the change; later callers start a new one
+        if action is None:
+            self._entries.clear()
+            self._inflight.clear()
+        else:
+            self._entries.pop(action, None)
+            self._inflight.pop(action, None)
+
+    def _refresh(self, action: str) -> asyncio.Task:
+        task = self._inflight.get(action)
+        if task is not None:
+            self.coalesced += 1
+            return task
+
+        task = asyncio.create_task(self._fetch(action))
+        self._inflight[action] = task
+        task.add_done_callback(lambda done: self._finish(action, done))
+        return task
+
+    def _finish(self, action: str, task: asyncio.Task):
+        if self._inflight.get(action) is task:
+            del self._inflight[action]
+        if not task.cancelled():
+            # Mark the exception as retrieved; awaiting callers still receive it
+            task.exception()
+
+    async def _fetch(self, action: str):
+        generation = self._generation
+        value = await self.bridge.request({"action": action})
+        if generation == self._generation:
+            self._entries[action] = (time.monotonic(), value)
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight)
+        }
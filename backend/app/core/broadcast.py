@@ -0,0 +1,82 @@
+# app/core/broadcast.py
+
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+
+class LogBroadcaster:
+    """
+    Fan-out of plugin log lines to dashboard websockets. Every client has its
+    own bounded queue and sender task, so publish() never waits on a client.
+    When a client's queue is full it is either disconnected (policy "drop")
+    or simply misses that line (policy "skip").
+    """
+
+    def __init__(self, queue_size: int, policy: str = "drop"):
+        self.queue_size = queue_size
+        self.policy = policy
+        self.published = 0
+        self.skipped_lines = 0
+        self.dropped_clients = 0
+        self._clients: Dict[object, Tuple[asyncio.Queue, asyncio.Task]] = {}
+        # Closes of dropped clients, referenced until done so they are not garbage collected
+        self._closing: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def add(self, websocket, backlog: Optional[List[str]] = None):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        task = asyncio.create_task(self._sender(websocket, queue, list(backlog or [])))
+        self._clients[websocket] = (queue, task)
+
+    def remove(self, websocket):
+        entry = self._clients.pop(websocket, None)
+        if entry is not None and entry[1] is not asyncio.current_task():
+            entry[1].cancel()
+
+    def publish(self, message: str):
+        self.published += 1
+        for websocket, (queue, _) in list(self._clients.items()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                if self.policy == "skip":
+                    self.skipped_lines += 1
+                else:
+                    self._drop(websocket)
+
+    def _drop(self, websocket):
+        self.dropped_clients += 1
+        self.remove(websocket)
+        task = asyncio.create_task(self._close(websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket):
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    async def _sender(self, websocket, queue: asyncio.Queue, backlog: List[str]):
+        try:
+            for message in backlog:
+                await websocket.send_text(message)
+            while True:
+                await websocket.send_text(await queue.get())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        finally:
+            self.remove(websocket)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "queue_size": self.queue_size,
+            "policy": self.policy,
+            "published": self.published,
+            "skipped_lines": self.skipped_lines,
+            "dropped_clients": self.dropped_clients
+        }
@@ -0,0 +1,168 @@
+# app/core/codes.py
+
+from fastapi import HTTPException
+from firebase_admin import firestore
+from app.core.cache import TTLCache
+from app.core.db import db
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import hashlib
+import hmac
+import os
+import time
+
+# One document per (purpose, user). Configure a Firestore TTL policy on
+# `expires_at` so finished documents are removed without any delete calls.
+CODES_COLLECTION = "one_time_codes"
+CODE_MAX_ATTEMPTS = int(os.getenv("CODE_MAX_ATTEMPTS", 5))
+CODE_RATE_LIMIT = int(os.getenv("CODE_RATE_LIMIT", 5))
+CODE_RATE_WINDOW = float(os.getenv("CODE_RATE_WINDOW", 3600))
+CODE_CACHE_SIZE = int(os.getenv("CODE_CACHE_SIZE", 4096))
+
+# purpose: seconds a code stays valid
+CODE_TTLS = {
+    "confirm_email": 300,
+    "password_reset": 300,
+    "password_reset_key": 600
+}
+
+# Results of CodeStore.consume
+CODE_OK = "ok"
+CODE_INVALID = "invalid"
+CODE_EXPIRED = "expired"
+CODE_MISSING = "missing"
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(str(value).encode()).hexdigest()
+
+class CodeStore:
+    """
+    One-time codes (email confirmation, password reset codes and keys). Codes
+    are issued and consumed inside transactions, so a code can be used once and
+    the rate limit holds even across workers; wrong guesses count against the
+    code and burn it after `max_attempts`. Issuing is limited to `rate_limit`
+    codes per purpose and user per `rate_window` seconds. Codes are stored hashed.
+
+    The issue history this process last saw is cached for `rate_window`
+    seconds, only to reject users who are already over the limit without a
+    transaction.
+    """
+
+    def __init__(self, collection: str, ttls: Dict[str, float], max_attempts: int, rate_limit: int, rate_window: float, cache_size: int):
+        self.collection = collection
+        self.ttls = ttls
+        self.max_attempts = max_attempts
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.issued = 0
+        self.consumed = 0
+        self.rejected = 0
+        self.rate_limited = 0
+        self._history = TTLCache(maxsize=cache_size, ttl=rate_window)
+
+    def _ref(self, purpose: str, user_id: str):
+        return db.collection(self.collection).document(f"{purpose}:{user_id}")
+
+    def _recent(self, issued: List[float], now: float) -> List[float]:
+        return [at for at in issued if at > now - self.rate_window]
+
+    def _reject(self, recent: List[float], now: float):
+        self.rate_limited += 1
+        retry_after = int(recent[0] + self.rate_window - now) + 1
+        raise HTTPException(status_code=429, detail={"error": "Too many codes requested, please try again later"}, headers={"Retry-After": str(retry_after)})
+
+    def issue(self, purpose: str, user_id: str, value: str) -> str:
+        ref = self._ref(purpose, user_id)
+        now = time.time()
+
+        # Issue times only accumulate, so a cached history over the limit is still over it
+        recent = self._recent(self._history.get(ref.id, []), now)
+        if len(recent) >= self.rate_limit:
+            self._reject(recent, now)
+
+        ttl = self.ttls[purpose]
+        data = {
+            "purpose": purpose,
+            "user_id": user_id,
+            "code": _digest(value),
+            "valid_until": now + ttl,
+            "attempts": 0,
+            # Kept until the rate-limit window has passed, then removed by the TTL policy
+            "expires_at": datetime.fromtimestamp(now + max(ttl, self.rate_window), tz=timezone.utc)
+        }
+        recent, issued = _issue(db.transaction(), ref, data, now, self.rate_limit, self.rate_window)
+        self._history.set(ref.id, recent)
+        if not issued:
+            self._reject(recent, now)
+
+        self.issued += 1
+        return value
+
+    def consume(self, purpose: str, user_id: str, value: str) -> str:
+        """
+        Check a code and use it up. Returns CODE_OK, CODE_INVALID, CODE_EXPIRED
+        or CODE_MISSING.
+        """
+        ref = self._ref(purpose, user_id)
+        result, data = _consume(db.transaction(), ref, _digest(value), self.max_attempts)
+        if data is not None:
+            self._history.set(ref.id, data.get("issued", []))
+
+        if result == CODE_OK:
+            self.consumed += 1
+        else:
+            self.rejected += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "issued": self.issued,
+            "consumed": self.consumed,
+            "rejected": self.rejected,
+            "rate_limited": self.rate_limited,
+            "history_cache": self._history.stats()
+        }
+
+@firestore.transactional
+def _issue(transaction, ref, data: dict, now: float, rate_limit: int, rate_window: float):
+    snapshot = ref.get(transaction=transaction)
+    previous = snapshot.to_dict() if snapshot.exists else {}
+    recent = [issued for issued in previous.get("issued", []) if issued > now - rate_window]
+    if len(recent) >= rate_limit:
+        return recent, False
+
+    data["issued"] = recent + [now]
+    transaction.set(ref, data)
+    return data["issued"], True
+
+@firestore.transactional
+def _consume(transaction, ref, digest: str, max_attempts: int):
+    snapshot = ref.get(transaction=transaction)
+    data = snapshot.to_dict() if snapshot.exists else None
+    if data is None or data.get("code") is None:
+        return CODE_MISSING, data
+
+    if data["valid_until"] < time.time():
+        result = CODE_EXPIRED
+    elif hmac.compare_digest(data["code"], digest):
+        result = CODE_OK
+    else:
+        data["attempts"] += 1
+        if data["attempts"] < max_attempts:
+            transaction.update(ref, {"attempts": data["attempts"]})
+            return CODE_INVALID, data
+        result = CODE_INVALID
+
+    # Used, expired or out of attempts: clear the code but keep the rate-limit history
+    data["code"] = None
+    transaction.update(ref, {"code": None, "attempts": data["attempts"]})
+    return result, data
+
+code_store = CodeStore(
+    collection=CODES_COLLECTION,
+    ttls=CODE_TTLS,
+    max_attempts=CODE_MAX_ATTEMPTS,
+    rate_limit=CODE_RATE_LIMIT,
+    rate_window=CODE_RATE_WINDOW,
+    cache_size=CODE_CACHE_SIZE
+)
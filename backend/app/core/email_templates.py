@@ -0,0 +1,127 @@
+# app/core/email_templates.py
+
+from app.core.mail import render_html_email
+from typing import Dict, List, Tuple
+import html
+import re
+
+class Slot:
+    """
+    Placeholder for a per-email value inside a block tree. Values are HTML
+    escaped unless the slot is created with escape=False.
+    """
+
+    def __init__(self, name: str, escape: bool = True):
+        self.name = name
+        self.escape = escape
+
+    def __str__(self) -> str:
+        return f"\x00{self.name}\x00"
+
+SLOT_PATTERN = re.compile(r"\x00(\w+)\x00")
+
+class EmailTemplate:
+    """
+    A block tree rendered once. The HTML is kept as static chunks with the
+    slot names between them, and the inline images are encoded once, so
+    render() is a single join.
+    """
+
+    def __init__(self, blocks: List[Dict]):
+        slots: Dict[str, Slot] = {}
+        self._collect(blocks, slots)
+
+        rendered, self.images = render_html_email(blocks)
+        pieces = SLOT_PATTERN.split(rendered)
+        self._chunks = pieces[0::2]
+        self._slots = [slots[name] for name in pieces[1::2]]
+        self.slot_names = set(slots)
+
+    def _collect(self, node, slots: Dict[str, Slot]):
+        if isinstance(node, Slot):
+            slots[node.name] = node
+        elif isinstance(node, dict):
+            for value in node.values():
+                self._collect(value, slots)
+        elif isinstance(node, list):
+            for value in node:
+                self._collect(value, slots)
+
+    def render(self, **values) -> Tuple[str, list]:
+        parts = [self._chunks[0]]
+        for slot, chunk in zip(self._slots, self._chunks[1:]):
+            value = str(values[slot.name])
+            parts.append(html.escape(value) if slot.escape else value)
+            parts.append(chunk)
+        return "".join(parts), self.images
+
+CODE_BOX_OPEN = "<div style='display: flex;height: 61px;width: 249px;justify-content: space-between;align-items: center;flex-direction: row;line-height: 14px;'>"
+DIGIT_BOXES = {digit: f"<div style='display: flex;height: 11px;padding: 19px 6px;border: 2px solid #6f67d9;border-radius: 7px;background-color: #f5f5f5;color: #000;font-size: 40px;'>{digit}</div>" for digit in "0123456789"}
+
+def code_boxes(code: int) -> str:
+    return CODE_BOX_OPEN + "".join(DIGIT_BOXES[digit] for digit in str(code)) + "</div>"
+
+FOOTER = [
+    {"type": "text", "content": "© 2025 SurfNetwork"},
+    {"type": "list", "content": [
+        {"type": "hyperlink", "content": "Privacy Policy", "link": "#"},
+        {"type": "hyperlink", "content": "Personal Data Protection and Privacy Policy", "link": "#"},
+        {"type": "hyperlink", "content": "Acceptable Use Policy", "link": "#"},
+    ]}
+]
+
+CONFIRM_EMAIL = EmailTemplate([
+    {
+        "type": "table",
+        "content": [
+            {
+                "type": "table",
+                "content": [
+                    # {"type": "image", "content": "image/logo.png"},
+                    {"type": "header", "content": "Verify Your Email Address"},
+                    {"type": "text", "content": "We just need to verify your email address to activate your SurfNetwork account. Here's your verification code:"},
+                    {"type": "html", "content": Slot("code_html", escape=False)},
+                    {"type": "html", "content": "This code expires within 5 minutes"},
+                    {"type": "text", "content": "Only enter this code on the SurfNetwork website. Don't share it with anyone. We'll never ask for it outside any of our platforms."},
+                    {"type": "text", "content": "Welcome aboard!"},
+                    {"type": "text", "content": "SurfNetwork Team"}
+                ]
+            }
+        ]
+    },
+    {
+        "type": "table",
+        "content": [
+            {"type": "text", "content": "This email was sent to you by the SurfNetwork because you signed up for a SurfNetwork account.break-linePlease let us know if you feel that this email was sent to you by error."},
+            *FOOTER
+        ]
+    }
+])
+
+PASSWORD_RESET = EmailTemplate([
+    {
+        "type": "table",
+        "content": [
+            {
+                "type": "table",
+                "content": [
+                    # {"type": "image", "content": "image/logo.png"},
+                    {"type": "header", "content": "Reset Your Password"},
+                    {"type": "text", "content": "We just need to verify it you before you can reset your password, here's your reset code:"},
+                    {"type": "html", "content": Slot("code_html", escape=False)},
+                    {"type": "html", "content": "This code expires within 5 minutes"},
+                    {"type": "text", "content": "Only enter this code on the SurfNetwork website or app. Don't share it with anyone. We'll never ask for it outside any of our platforms."},
+                    {"type": "text", "content": "If you see this email and you didn't request a password reset, click below to go to \"Acccount Management\" to secure your account"},
+                    {"type": "button", "content": "Account Management", "hyperlink": "#"}
+                ]
+            }
+        ]
+    },
+    {
+        "type": "table",
+        "content": [
+            {"type": "text", "content": "This email was sent to you by SurfNetwork because you signed up for a SurfNetwork account.break-linePlease let us know if you feel that this email was sent to you by error."},
+            *FOOTER
+        ]
+    }
+])
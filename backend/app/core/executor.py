@@ -0,0 +1,19 @@
+# app/core/executor.py
+
+from fastapi.concurrency import run_in_threadpool
+import anyio.to_thread
+import os
+
+# Sync route handlers and run_blocking() share this one bounded pool of worker threads
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", 40))
+
+def configure_blocking_pool():
+    # Must run inside the event loop: the limiter is per-loop
+    anyio.to_thread.current_default_thread_limiter().total_tokens = BLOCKING_WORKERS
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking call (Firestore, bcrypt, file IO) from an async handler
+    without stalling the event loop.
+    """
+    return await run_in_threadpool(func, *args, **kwargs)
@@ -0,0 +1,109 @@
+# app/core/forum_store.py
+
+from firebase_admin import firestore
+from app.core.db import db
+from typing import Any, Dict, List, Optional
+
+# Layout:
+#   forums/{category}                    {"name", "topic_count"}
+#   forums/{category}/topics/{topic_id}  one document per topic, tagged with its "category", "reply_count" instead of a reply list
+#   forums/{category}/replies/{reply_id} one document per reply, tagged with the "topic_id" of its thread
+FORUMS_COLLECTION = "forums"
+TOPICS_COLLECTION = "topics"
+REPLIES_COLLECTION = "replies"
+
+MIGRATION_BATCH_SIZE = 400
+
+def category_ref(category_name: str):
+    return db.collection(FORUMS_COLLECTION).document(category_name)
+
+def topics_ref(category_name: str):
+    return category_ref(category_name).collection(TOPICS_COLLECTION)
+
+def replies_ref(category_name: str):
+    return category_ref(category_name).collection(REPLIES_COLLECTION)
+
+def _thread_of(reply_id: str, replies_by_id: Dict[str, Dict[str, Any]], topic_ids: set) -> Optional[str]:
+    seen = set()
+    current = reply_id
+    while current not in seen:
+        seen.add(current)
+        parent = str(replies_by_id[current].get("parent_id"))
+        if parent in topic_ids:
+            return parent
+        if parent not in replies_by_id:
+            return None
+        current = parent
+
+    return None
+
+def tag_topic_categories(category_name: str, dry_run: bool = False) -> int:
+    """
+    Add the "category" field to topics written before it existed; return how many were missing it.
+    """
+    refs = [doc.reference for doc in topics_ref(category_name).stream() if (doc.to_dict() or {}).get("category") is None]
+    if dry_run:
+        return len(refs)
+
+    for start in range(0, len(refs), MIGRATION_BATCH_SIZE):
+        batch = db.batch()
+        for ref in refs[start:start + MIGRATION_BATCH_SIZE]:
+            batch.update(ref, {"category": category_name})
+        batch.commit()
+
+    return len(refs)
+
+def migrate_category(snapshot, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Move the "topics" and "replies" arrays of a legacy category document into
+    the topics/replies subcollections. Safe to run more than once.
+    """
+    category = snapshot.to_dict() or {}
+    if "topics" not in category and "replies" not in category:
+        return {"category": snapshot.id, "skipped": True}
+
+    topics: List[Dict[str, Any]] = category.get("topics") or []
+    replies: List[Dict[str, Any]] = category.get("replies") or []
+
+    topic_ids = {str(topic.get("id")) for topic in topics}
+    replies_by_id = {str(reply.get("id")): reply for reply in replies}
+    reply_counts = dict.fromkeys(topic_ids, 0)
+    writes = []
+    orphans = []
+
+    for reply_id, reply in replies_by_id.items():
+        topic_id = _thread_of(reply_id, replies_by_id, topic_ids)
+        if topic_id is None:
+            orphans.append(reply_id)
+            continue
+
+        reply_counts[topic_id] += 1
+        data = {key: value for key, value in reply.items() if key != "replies"}
+        data["topic_id"] = topic_id
+        writes.append((replies_ref(snapshot.id).document(reply_id), data))
+
+    for topic in topics:
+        topic_id = str(topic.get("id"))
+        data = {key: value for key, value in topic.items() if key != "replies"}
+        data["category"] = snapshot.id
+        data["reply_count"] = reply_counts[topic_id]
+        writes.append((topics_ref(snapshot.id).document(topic_id), data))
+
+    report = {"category": snapshot.id, "topics": len(topics), "replies": len(replies) - len(orphans), "orphans": orphans}
+    if dry_run:
+        return report
+
+    for start in range(0, len(writes), MIGRATION_BATCH_SIZE):
+        batch = db.batch()
+        for ref, data in writes[start:start + MIGRATION_BATCH_SIZE]:
+            batch.set(ref, data)
+        batch.commit()
+
+    snapshot.reference.set({
+        "name": snapshot.id,
+        "topic_count": firestore.Increment(len(topics)),
+        "topics": firestore.DELETE_FIELD,
+        "replies": firestore.DELETE_FIELD
+    }, merge=True)
+
+    return report
@@ -0,0 +1,130 @@
+# app/core/hashing.py
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+from fastapi import HTTPException
+import multiprocessing
+import os
+import threading
+import time
+import bcrypt
+
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", os.cpu_count() or 2))
+BCRYPT_QUEUE_SIZE = int(os.getenv("BCRYPT_QUEUE_SIZE", 64))
+BCRYPT_TIMEOUT = float(os.getenv("BCRYPT_TIMEOUT", 10))
+LATENCY_SAMPLES = 1024
+
+def _hashpw(password: bytes) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt())
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+class BcryptPool:
+    """
+    Runs bcrypt in a pool of worker processes so a burst of logins cannot tie up
+    the request threads. At most `workers + queue_size` calls may be running or
+    waiting; any call beyond that fails immediately with a 503.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.calls = 0
+        self.rejected = 0
+        self._in_flight = 0
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._latencies = {"hash": deque(maxlen=LATENCY_SAMPLES), "verify": deque(maxlen=LATENCY_SAMPLES)}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _run(self, op: str, func, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail={"error": "Server is busy, please try again shortly"}, headers={"Retry-After": "1"})
+
+        with self._lock:
+            self._in_flight += 1
+            self.calls += 1
+
+        start = time.perf_counter()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BrokenProcessPool:
+            self._reset()
+            self._release()
+            raise HTTPException(status_code=503, detail={"error": "Password service restarting, please try again"})
+        except Exception:
+            self._release()
+            raise
+
+        # The slot is held until the worker is really done, even if we stop waiting
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except BrokenProcessPool:
+            self._reset()
+            raise HTTPException(status_code=503, detail={"error": "Password service restarting, please try again"})
+        except TimeoutError:
+            raise HTTPException(status_code=503, detail={"error": "Password service timed out"})
+        finally:
+            self._latencies[op].append(time.perf_counter() - start)
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def hash(self, password: str) -> str:
+        return self._run("hash", _hashpw, password.encode()).decode()
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._run("verify", _checkpw, password.encode(), hashed.encode())
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        latency = {}
+        for op, samples in self._latencies.items():
+            values = sorted(samples)
+            latency[op] = {
+                "count": len(values),
+                "p50": _percentile(values, 0.50),
+                "p95": _percentile(values, 0.95),
+                "p99": _percentile(values, 0.99),
+                "max": values[-1] if values else 0.0
+            }
+
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": self._in_flight,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "latency": latency
+        }
+
+bcrypt_pool = BcryptPool(workers=BCRYPT_WORKERS, queue_size=BCRYPT_QUEUE_SIZE, timeout=BCRYPT_TIMEOUT)
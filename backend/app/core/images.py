@@ -0,0 +1,146 @@
+# app/core/images.py
+
+from fastapi import HTTPException
+from fastapi.staticfiles import StaticFiles
+from starlette.types import Scope
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from PIL import Image
+import filetype
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+PUBLIC_DIR = Path(os.getenv("PUBLIC_DIR", "public"))
+PUBLIC_URL = "/public"
+# Content-addressed files live here; a name never points at different bytes
+IMAGE_DIR = "img"
+THUMBNAIL_SIZES = (64, 128, 256)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    StaticFiles that lets browsers keep content-hashed images forever.
+    Everything else keeps the default ETag/Last-Modified revalidation.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only this exact directory is content-addressed, not any other folder named like it
+        self.image_dir = (Path(self.directory) / IMAGE_DIR).resolve()
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if Path(full_path).resolve().parent == self.image_dir:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers.setdefault("Cache-Control", "no-cache")
+        return response
+
+def _write_once(path: Path, data: bytes):
+    if path.exists():
+        return
+    # A unique temp file per writer: two threads may store the same image at once
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False) as partial:
+        partial.write(data)
+    try:
+        os.replace(partial.name, path)
+    except OSError:
+        Path(partial.name).unlink(missing_ok=True)
+        # Same name means same bytes, so losing the race to another writer is fine
+        if not path.exists():
+            raise
+
+class ImageStore:
+    """
+    Stores images under their content hash in the public mount and renders
+    each thumbnail size once. Files on disk are hashed again only when their
+    mtime changes.
+    """
+
+    def __init__(self, public_dir: Path, sizes: Tuple[int, ...]):
+        self.directory = public_dir / IMAGE_DIR
+        self.sizes = sizes
+        self.stored = 0
+        self.thumbnails = 0
+        self._published: Dict[str, Tuple[float, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def url(self, name: str) -> str:
+        return f"{PUBLIC_URL}/{IMAGE_DIR}/{name}"
+
+    def store(self, image_bytes: bytes) -> Dict[str, str]:
+        """
+        Save an image and its thumbnails; return their URLs keyed by "original"
+        and by size.
+        """
+        kind = filetype.guess(image_bytes)
+        if kind is None or not kind.mime.startswith("image/"):
+            raise HTTPException(status_code=400, detail={"error": "File is not a valid image"})
+
+        digest = hashlib.sha256(image_bytes).hexdigest()[:20]
+        original = f"{digest}.{kind.extension}"
+        if not (self.directory / original).exists():
+            _write_once(self.directory / original, image_bytes)
+            self.stored += 1
+
+        urls = {"original": self.url(original)}
+        for size in self.sizes:
+            urls[str(size)] = self.url(self._thumbnail(digest, image_bytes, size))
+        return urls
+
+    def _thumbnail(self, digest: str, image_bytes: bytes, size: int) -> str:
+        name = f"{digest}_{size}.webp"
+        path = self.directory / name
+        if path.exists():
+            return name
+
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image.thumbnail((size, size))
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            output = io.BytesIO()
+            image.save(output, format="WEBP", quality=85)
+
+        _write_once(path, output.getvalue())
+        self.thumbnails += 1
+        return name
+
+    def publish(self, source) -> Optional[Dict[str, str]]:
+        """
+        URLs for an image file elsewhere on disk, e.g. an admin avatar, or None
+        if it does not exist or is not an image.
+        """
+        path = Path(source)
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return None
+
+        entry = self._published.get(str(path))
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        try:
+            urls = self.store(path.read_bytes())
+        except HTTPException:
+            return None
+        except OSError as e:
+            print(f"Error publishing image {path}: {e}")
+            return None
+
+        with self._lock:
+            self._published[str(path)] = (mtime, urls)
+        return urls
+
+    def stats(self) -> dict:
+        return {
+            "stored": self.stored,
+            "thumbnails": self.thumbnails,
+            "published": len(self._published)
+        }
+
+image_store = ImageStore(public_dir=PUBLIC_DIR, sizes=THUMBNAIL_SIZES)
@@ -0,0 +1,253 @@
+# app/core/logarchive.py
+
+from collections import deque
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+import bisect
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+# (offset, unix time, line); offsets count every line ever archived and never repeat
+LogEntry = Tuple[int, float, str]
+# Longest a disk replay waits for the writer to reach the tail
+REPLAY_FLUSH_TIMEOUT = 5.0
+
+class LogArchive:
+    """
+    Server log storage in two tiers: an in-memory deque holding the most recent
+    `tail_size` lines, and an append-only archive of segment files on disk.
+    Each segment is named after its first offset and first timestamp; once it
+    reaches `segment_bytes` it is closed and gzipped, and the oldest segments
+    beyond `max_segments` are deleted.
+
+    append() only updates memory and queues the line; a writer thread started
+    by start() does all file work, so callers on the event loop never touch
+    the disk. The writer also hands each written batch to `listeners`.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int, max_segments: int, tail_size: int):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.tail: deque = deque(maxlen=tail_size)
+        self.next_offset = 0
+        self._file = None
+        self._size = 0
+        # LogEntry to write, a Path to compress, or None to stop
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        # Called on the writer thread with each batch of entries written
+        self.listeners: List[Callable[[List[LogEntry]], None]] = []
+        # Highest offset written and flushed to disk
+        self.flushed_offset = -1
+        self._written_offset = -1
+        self._flushed = threading.Condition()
+
+    @staticmethod
+    def _parse_name(path: Path) -> Tuple[int, float]:
+        offset, millis = path.name.split(".")[0].split("-")
+        return int(offset), int(millis) / 1000
+
+    def _segments(self) -> List[Tuple[int, float, Path]]:
+        segments = []
+        if not self.directory.is_dir():
+            return segments
+        for path in self.directory.iterdir():
+            if not path.name.endswith((".log", ".log.gz")):
+                continue
+            try:
+                offset, started = self._parse_name(path)
+            except ValueError:
+                continue
+            if path.suffix == ".log" and path.with_suffix(".log.gz").exists():
+                continue
+            segments.append((offset, started, path))
+        return sorted(segments)
+
+    def _recover(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = self._segments()
+        if segments:
+            start, _, path = segments[-1]
+            last = list(self._read_segment(path))
+            self.next_offset = last[-1][0] + 1 if last else start
+            self.flushed_offset = self._written_offset = self.next_offset - 1
+
+        # Appending always starts a fresh segment, so anything left uncompressed is closed
+        for _, _, path in segments:
+            if path.suffix == ".log":
+                self._queue.put(path)
+
+        if segments:
+            self.tail.extend(self.replay(start_offset=max(0, self.next_offset - self.tail.maxlen), limit=self.tail.maxlen))
+
+    def _open_segment(self, offset: int, timestamp: float):
+        path = self.directory / f"{offset:012d}-{int(timestamp * 1000):013d}.log"
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = 0
+
+    def _compress(self, path: Path):
+        target = path.with_suffix(".log.gz")
+        partial = path.with_suffix(".log.gz.tmp")
+        with open(path, "rb") as source, gzip.open(partial, "wb") as compressed:
+            shutil.copyfileobj(source, compressed)
+        os.replace(partial, target)
+        path.unlink(missing_ok=True)
+
+    def _rotate(self):
+        path = Path(self._file.name)
+        self._file.close()
+        self._file = None
+        self._compress(path)
+
+        segments = self._segments()
+        for _, _, old in segments[:max(0, len(segments) - self.max_segments)]:
+            old.unlink(missing_ok=True)
+
+    def _write(self, entry: LogEntry):
+        if self._file is None:
+            self._open_segment(entry[0], entry[1])
+        record = json.dumps(entry) + "\n"
+        self._file.write(record)
+        self._written_offset = entry[0]
+        self._size += len(record)
+        if self._size >= self.segment_bytes:
+            self._rotate()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            # Write whatever else is already waiting before flushing once
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            written = []
+            for item in items:
+                try:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, Path):
+                        self._compress(item)
+                    else:
+                        self._write(item)
+                        written.append(item)
+                except Exception as e:
+                    print(f"Error archiving server log: {e}")
+
+            try:
+                if self._file is not None:
+                    self._file.flush()
+            except Exception as e:
+                print(f"Error archiving server log: {e}")
+
+            with self._flushed:
+                self.flushed_offset = self._written_offset
+                self._flushed.notify_all()
+
+            for listener in self.listeners:
+                try:
+                    listener(written)
+                except Exception as e:
+                    print(f"Error in server log listener: {e}")
+
+            for _ in items:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def append(self, line: str, timestamp: Optional[float] = None) -> LogEntry:
+        timestamp = time.time() if timestamp is None else timestamp
+        entry = (self.next_offset, timestamp, line)
+        self.next_offset += 1
+        self.tail.append(entry)
+        self._queue.put_nowait(entry)
+        return entry
+
+    def _read_segment(self, path: Path) -> Iterator[LogEntry]:
+        opener = gzip.open if path.suffix == ".gz" else open
+        try:
+            with opener(path, "rt", encoding="utf-8") as segment:
+                for record in segment:
+                    try:
+                        offset, timestamp, line = json.loads(record)
+                    except ValueError:
+                        continue
+                    yield offset, timestamp, line
+        except (FileNotFoundError, EOFError):
+            return
+
+    def replay(self, start_offset: Optional[int] = None, since: Optional[float] = None, until: Optional[float] = None, limit: int = 1000) -> List[LogEntry]:
+        """
+        Return up to `limit` lines from `start_offset` or from time `since` onwards
+        (and before `until`), oldest first. Served from memory when the range
+        starts inside the tail, otherwise read from the segments on disk.
+        """
+        start_offset = start_offset or 0
+        since = since or 0.0
+        until = until if until is not None else float("inf")
+
+        tail = list(self.tail)
+        # Offsets and times only grow, so the range starts inside the tail if either bound is past its head
+        if tail and (tail[0][0] == 0 or start_offset >= tail[0][0] or since > tail[0][1]):
+            entries = (entry for entry in tail if entry[0] >= start_offset and entry[1] >= since)
+        else:
+            # Wait for the writer to reach the tail head, not for an idle queue: appends never stop while the plugin streams
+            if tail and self._thread is not None:
+                with self._flushed:
+                    self._flushed.wait_for(lambda: self.flushed_offset >= tail[0][0] - 1, timeout=REPLAY_FLUSH_TIMEOUT)
+            entries = self._scan(start_offset, since)
+
+        result = []
+        for entry in entries:
+            if entry[1] >= until or len(result) >= limit:
+                break
+            result.append(entry)
+        return result
+
+    def _scan(self, start_offset: int, since: float) -> Iterator[LogEntry]:
+        segments = self._segments()
+        # The first segment to read is the last one starting at or before the requested point
+        by_offset = bisect.bisect_right([segment[0] for segment in segments], start_offset) - 1
+        by_time = bisect.bisect_right([segment[1] for segment in segments], since) - 1
+        for _, _, path in segments[max(0, by_offset, by_time):]:
+            for entry in self._read_segment(path):
+                if entry[0] >= start_offset and entry[1] >= since:
+                    yield entry
+
+    def start(self):
+        """
+        Read the archive back from disk and start the writer thread. Call before
+        the first append(), off the event loop.
+        """
+        if self._thread is None:
+            self._recover()
+            self._thread = threading.Thread(target=self._run, name="log-archive", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        segments = self._segments()
+        return {
+            "next_offset": self.next_offset,
+            "tail": len(self.tail),
+            "queued": self._queue.qsize(),
+            "segments": len(segments),
+            "bytes_on_disk": sum(path.stat().st_size for _, _, path in segments if path.exists())
+        }
@@ -0,0 +1,216 @@
+# app/core/logsearch.py
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import bisect
+import re
+import threading
+
+from app.core.logarchive import LogEntry
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+LEVEL_PATTERN = re.compile(r"\b(TRACE|DEBUG|INFO|WARN|WARNING|ERROR|SEVERE|FATAL)\b")
+LEVEL_ALIASES = {"WARNING": "WARN", "SEVERE": "ERROR"}
+# Only look for the level in the line prefix, e.g. "[12:00:00] [Server thread/WARN]: ..."
+LEVEL_PREFIX = 64
+# Lines that tell us a player name exists: joins, logins, chat
+PLAYER_PATTERNS = [
+    re.compile(r"UUID of player (\w{3,16}) is"),
+    re.compile(r"\b(\w{3,16})\[/[^\]]*\] logged in"),
+    re.compile(r"\b(\w{3,16}) (?:joined|left) the game"),
+    re.compile(r"<(\w{3,16})> ")
+]
+
+# Oldest lines dropped at a time once the index is full
+PRUNE_LINES = 256
+# Posting lists trimmed per add after a drop, so a round over ~7k lists ends before the next drop
+PRUNE_KEYS = 32
+# Most candidate offsets one search examines before returning a cursor
+SEARCH_SCAN_BUDGET = 20_000
+
+def tokenize(text: str) -> Set[str]:
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+def index_tokens(text: str) -> Set[str]:
+    # Numbers (coordinates, ids, counts) would each get a posting list; queries match them by scanning instead
+    return {token for token in tokenize(text) if not token.isdigit()}
+
+def parse_level(line: str) -> Optional[str]:
+    match = LEVEL_PATTERN.search(line, 0, LEVEL_PREFIX)
+    if match is None:
+        return None
+    return LEVEL_ALIASES.get(match.group(1), match.group(1))
+
+class LogIndex:
+    """
+    In-memory inverted index over the most recent `max_lines` log lines.
+    Postings are array("q") lists of log offsets, kept sorted because lines
+    arrive in offset order, so queries intersect postings instead of scanning
+    lines. Purely numeric tokens are not indexed.
+
+    Every add past `max_lines` drops at most PRUNE_LINES old lines and trims
+    at most PRUNE_KEYS posting lists, so no single add pays for a full prune;
+    searches never look below the oldest kept line, so untrimmed postings are
+    harmless. A search examines at most `scan_budget` candidates and returns a
+    cursor to continue from. Add and search run under one lock, off the
+    event loop.
+    """
+
+    def __init__(self, max_lines: int, scan_budget: int = SEARCH_SCAN_BUDGET):
+        self.max_lines = max_lines
+        self.scan_budget = scan_budget
+        self._offsets = array("q")
+        self._times = array("d")
+        self._lines: List[str] = []
+        self._tokens: Dict[str, array] = {}
+        self._levels: Dict[str, array] = {}
+        self._players: Dict[str, array] = {}
+        self._known_players: Set[str] = set()
+        # Posting lists still to trim in the current round: (postings dict, key)
+        self._trim_queue: List[Tuple[Dict[str, array], str]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def add(self, entry: LogEntry):
+        with self._lock:
+            self._add(entry)
+
+    def extend(self, entries: Iterable[LogEntry]):
+        with self._lock:
+            for entry in entries:
+                self._add(entry)
+
+    def _add(self, entry: LogEntry):
+        offset, timestamp, line = entry
+        if self._offsets and offset <= self._offsets[-1]:
+            return
+
+        self._offsets.append(offset)
+        # Keep times sorted for bisect even if the plugin clock steps back
+        self._times.append(max(timestamp, self._times[-1]) if self._times else timestamp)
+        self._lines.append(line)
+
+        tokens = index_tokens(line)
+        for token in tokens:
+            self._tokens.setdefault(token, array("q")).append(offset)
+
+        level = parse_level(line)
+        if level is not None:
+            self._levels.setdefault(level, array("q")).append(offset)
+
+        for pattern in PLAYER_PATTERNS:
+            match = pattern.search(line)
+            if match is not None:
+                self._known_players.add(match.group(1).lower())
+        for player in tokens & self._known_players:
+            self._players.setdefault(player, array("q")).append(offset)
+
+        if len(self._offsets) > self.max_lines:
+            self._prune()
+
+    def _prune(self):
+        # Dropping lines shifts the whole column, so do it once per PRUNE_LINES adds
+        if len(self._offsets) >= self.max_lines + PRUNE_LINES:
+            del self._offsets[:PRUNE_LINES]
+            del self._times[:PRUNE_LINES]
+            del self._lines[:PRUNE_LINES]
+            if not self._trim_queue:
+                self._trim_queue = [(postings, key) for postings in (self._tokens, self._levels, self._players) for key in postings]
+        floor = self._offsets[0]
+
+        for _ in range(min(PRUNE_KEYS, len(self._trim_queue))):
+            postings, key = self._trim_queue.pop()
+            offsets = postings.get(key)
+            if offsets is None:
+                continue
+            cut = bisect.bisect_left(offsets, floor)
+            if cut == len(offsets):
+                del postings[key]
+            elif cut:
+                del offsets[:cut]
+
+    def search(self, query: str = "", level: Optional[str] = None, player: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None, before: Optional[int] = None, limit: int = 100) -> Tuple[List[LogEntry], Optional[int]]:
+        """
+        Return matching lines newest first, and the offset to pass as `before`
+        for the next page (None when there are no more). Every query term, the
+        level and the player must all match. A page may come back short, even
+        empty, with a cursor when the scan budget runs out first.
+        """
+        with self._lock:
+            return self._search(query, level, player, since, until, before, limit)
+
+    def _search(self, query: str, level: Optional[str], player: Optional[str], since: Optional[float], until: Optional[float], before: Optional[int], limit: int) -> Tuple[List[LogEntry], Optional[int]]:
+        if not self._offsets:
+            return [], None
+
+        # Narrow to an offset window from the time and paging bounds
+        start = bisect.bisect_left(self._times, since) if since is not None else 0
+        end = bisect.bisect_left(self._times, until) if until is not None else len(self._times)
+        if before is not None:
+            end = min(end, bisect.bisect_left(self._offsets, before))
+        if start >= end:
+            return [], None
+        low, high = self._offsets[start], self._offsets[end - 1]
+
+        terms = tokenize(query)
+        numbers = {term for term in terms if term.isdigit()}
+        lists = []
+        for token in terms - numbers:
+            lists.append(self._tokens.get(token))
+        if level:
+            lists.append(self._levels.get(LEVEL_ALIASES.get(level.upper(), level.upper())))
+        if player:
+            lists.append(self._players.get(player.lower()))
+        if any(postings is None for postings in lists):
+            return [], None
+
+        if lists:
+            lists.sort(key=len)
+            driver, others = lists[0], lists[1:]
+            first = bisect.bisect_left(driver, low)
+            candidates = (driver[i] for i in range(bisect.bisect_right(driver, high) - 1, first - 1, -1))
+        else:
+            others = []
+            candidates = (self._offsets[i] for i in range(end - 1, start - 1, -1))
+
+        results: List[LogEntry] = []
+        scanned = 0
+        for offset in candidates:
+            if scanned == self.scan_budget:
+                return results, offset + 1
+            scanned += 1
+
+            if not all(self._contains(postings, offset) for postings in others):
+                continue
+            position = bisect.bisect_left(self._offsets, offset)
+            line = self._lines[position]
+            # Substring test first: most lines fail it, and it is far cheaper than tokenizing
+            if numbers and not (all(number in line for number in numbers) and numbers <= tokenize(line)):
+                continue
+            if len(results) == limit:
+                return results, results[-1][0]
+            results.append((offset, self._times[position], line))
+
+        return results, None
+
+    @staticmethod
+    def _contains(postings: array, offset: int) -> bool:
+        index = bisect.bisect_left(postings, offset)
+        return index < len(postings) and postings[index] == offset
+
+    def stats(self) -> dict:
+        with self._lock:
+            return self._stats()
+
+    def _stats(self) -> dict:
+        return {
+            "lines": len(self._offsets),
+            "max_lines": self.max_lines,
+            "oldest_offset": self._offsets[0] if self._offsets else None,
+            "tokens": len(self._tokens),
+            "postings": sum(len(postings) for postings in self._tokens.values()),
+            "levels": {level: len(postings) for level, postings in self._levels.items()},
+            "players": len(self._known_players)
+        }
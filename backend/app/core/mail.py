@@ -1,4 +1,6 @@
-from mailjet_rest import Client
+from app.core.outbox import MailOutbox
+from app.core.transports import make_transport
+from functools import lru_cache
 from typing import List, Dict
 import os
 import base64
@@ -6,43 +8,56 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-api_key = os.getenv("MAILJET_API_KEY")
-api_secret = os.getenv("MAILJET_SECRET_KEY")
 sender_email = os.getenv("SENDER_EMAIL")
 sender_name = os.getenv("SENDER_NAME")
 
-if api_key is None or api_secret is None:
-    raise ValueError("MAILJET_API_KEY and MAILJET_SECRET_KEY must be set in environment variables.")
+# mailjet (default), memory for local runs and load tests, or http for any Mailjet-compatible endpoint
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "mailjet")
+transport = make_transport(MAIL_TRANSPORT)
+
+def build_message(to_email: str, to_name: str, subject: str, html: str, images: list) -> dict:
+    return {
+        "From": {
+            "Email": sender_email,
+            "Name": sender_name
+        },
+        "To": [{
+            "Email": to_email,
+            "Name": to_name
+        }],
+        "Subject": subject,
+        "HTMLPart": html,
+        "InlineAttachments": images
+    }
 
-mailjet = Client(auth=(api_key, api_secret), version='v3.1')
+mail_outbox = MailOutbox(
+    path=os.getenv("MAIL_OUTBOX_PATH", "outbox.sqlite3"),
+    sender=transport.send,
+    batch_size=int(os.getenv("MAIL_BATCH_SIZE", 50)),
+    interval=float(os.getenv("MAIL_FLUSH_INTERVAL", 1)),
+    max_attempts=int(os.getenv("MAIL_MAX_ATTEMPTS", 8)),
+    backoff=float(os.getenv("MAIL_RETRY_BACKOFF", 5)),
+    max_backoff=float(os.getenv("MAIL_RETRY_MAX_BACKOFF", 900)),
+    # Longer than any one send can take, or a slow batch is claimed and sent twice
+    lease=float(os.getenv("MAIL_CLAIM_LEASE", 300))
+)
 
 def send_html_email(to_email: str, to_name: str, subject: str, html_content: List[Dict], inline_images: list = []):
     """
-    Send an HTML email using Mailjet with optional inline images.
+    Render an HTML email and queue it for sending through the configured transport.
     inline_images: list of dicts with keys: "ContentID", "ContentType", "Filename", "Base64Content"
     """
     html, images = render_html_email(html_content)
+    message_id = mail_outbox.enqueue(build_message(to_email, to_name, subject, html, images + inline_images))
+    return {"status": "queued", "id": message_id}
 
-    message = {
-        "Messages": [
-            {
-                "From": {
-                    "Email": sender_email,
-                    "Name": sender_name
-                },
-                "To": [{
-                    "Email": to_email,
-                    "Name": to_name
-                }],
-                "Subject": subject,
-                "HTMLPart": html,
-                "InlineAttachments": images
-            }
-        ]
-    }
-
-    result = mailjet.send.create(data=message)
-    return result.json()
+def send_rendered_email(to_email: str, to_name: str, subject: str, template, **values):
+    """
+    Queue an email from a precompiled EmailTemplate, filling its slots from values.
+    """
+    html, images = template.render(**values)
+    message_id = mail_outbox.enqueue(build_message(to_email, to_name, subject, html, images))
+    return {"status": "queued", "id": message_id}
 
 
 def render_block(block: Dict) -> str:
@@ -134,6 +149,7 @@ def render_block(block: Dict) -> str:
 
     return ""
 
+@lru_cache(maxsize=64)
 def encode_image_as_base64(file_path: str):
     with open(file_path, "rb") as img:
         b64 = base64.b64encode(img.read()).decode("utf-8")
@@ -1,91 +1,182 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
-from app.core.utils import verify_admin
+from fastapi import APIRouter, Depends, Request, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.core.bridge import PluginBridge, PluginReadCache
+from app.core.broadcast import LogBroadcaster
+from app.core.auth import require_admin
+from app.core.executor import run_blocking
+from app.core.logarchive import LogArchive, LogEntry
+from app.core.logsearch import LogIndex
+from app.core.timeseries import StatsRing
+from app.models.mc_model import PluginAction, PluginBatch
 from app.models.util_model import UserData
-import uuid
 import asyncio
 import json
+import os
+import time
 
 router = APIRouter()
 
-plugin_ws = None
-pending_requests = {}
-dashboard_clients = []
-
-pending_logs: list[str] = []
-MAX_LOGS = 500
-
-def add_log(log_message: str):
-    pending_logs.append(log_message)
-    if len(pending_logs) > MAX_LOGS:
-        pending_logs.pop(0)
+bridge = PluginBridge(
+    max_in_flight=int(os.getenv("MC_MAX_IN_FLIGHT", 64)),
+    timeout=float(os.getenv("MC_REQUEST_TIMEOUT", 30)),
+    acquire_timeout=float(os.getenv("MC_ACQUIRE_TIMEOUT", 2))
+)
+# Read-only actions answered from memory: seconds each answer stays fresh
+PLUGIN_CACHE_TTLS = {
+    "get_ip": 300,
+    "get_player_count": 5,
+    "get_server_stats": 5,
+    "get_status": 5,
+    "get_players": 5
+}
+plugin_cache = PluginReadCache(bridge, ttls=PLUGIN_CACHE_TTLS, stale_for=float(os.getenv("MC_CACHE_STALE_FOR", 30)))
+log_broadcaster = LogBroadcaster(
+    queue_size=int(os.getenv("MC_LOG_CLIENT_QUEUE", 1000)),
+    policy=os.getenv("MC_LOG_SLOW_CLIENT_POLICY", "drop")
+)
+
+# Metrics pushed by the plugin as {"stats": {...}}; the default capacity is 24h of 5s samples
+STATS_FIELDS = os.getenv("MC_STATS_FIELDS", "tps,players,memory").split(",")
+stats_ring = StatsRing(fields=STATS_FIELDS, capacity=int(os.getenv("MC_STATS_CAPACITY", 17280)))
+
+# resolution: (bucket size, history window) in seconds
+STATS_RESOLUTIONS = {
+    "1m": (60, 3600),
+    "5m": (300, 6 * 3600),
+    "1h": (3600, 24 * 3600)
+}
+
+# The newest lines stay in memory; everything is also archived to rotating gzip segments on disk
+log_archive = LogArchive(
+    directory=os.getenv("MC_LOG_DIR", "logs"),
+    segment_bytes=int(os.getenv("MC_LOG_SEGMENT_BYTES", 8 * 1024 * 1024)),
+    max_segments=int(os.getenv("MC_LOG_MAX_SEGMENTS", 256)),
+    tail_size=int(os.getenv("MC_LOG_TAIL", 500))
+)
+MAX_LOG_REPLAY = int(os.getenv("MC_LOG_REPLAY_LIMIT", 5000))
+log_index = LogIndex(max_lines=int(os.getenv("MC_LOG_INDEX_LINES", 200_000)))
+log_archive.listeners.append(log_index.extend)
+LOG_INDEX_WARM_LINES = int(os.getenv("MC_LOG_INDEX_WARM", 50_000))
+MAX_LOG_SEARCH = 500
+
+def add_log(log_message: str) -> LogEntry:
+    # Indexed by the archive writer thread, not here on the event loop
+    return log_archive.append(log_message)
+
+def warm_log_index():
+    # Index the most recent archived lines once at startup, before the plugin connects
+    start = max(0, log_archive.next_offset - LOG_INDEX_WARM_LINES)
+    log_index.extend(log_archive.replay(start_offset=start, limit=LOG_INDEX_WARM_LINES))
+
+def log_payload(entry: LogEntry) -> str:
+    offset, timestamp, line = entry
+    return json.dumps({"log": line, "offset": offset, "time": timestamp})
 
 
 @router.websocket("/ws")
 async def ws(websocket: WebSocket):
-    global plugin_ws
     await websocket.accept()
     await websocket.send_text("{\"message\": \"Connected!\"}")
-    plugin_ws = websocket
+    await bridge.attach(websocket)
     try:
 
         while True:
             data = await websocket.receive_text()
+            bridge.touch()
             json_data = json.loads(data)
 
             if "log" in json_data:
-                log_message = json_data["log"]
-                add_log(log_message)
-
-                # Forward to dashboards
-                for ws in list(dashboard_clients):
-                    try:
-                        await ws.send_text(json.dumps({"log": log_message}))
-                    except:
-                        dashboard_clients.remove(ws)
-
-            request_id = json_data.get("request_id")
-            response = json_data.get("response")
-            if request_id in pending_requests:
-                fut = pending_requests.pop(request_id)
-                fut.set_result(response)                                                                                                                                                       
+                entry = add_log(json_data["log"])
+
+                # Forward to dashboards without waiting on any of them
+                log_broadcaster.publish(log_payload(entry))
+
+            if isinstance(json_data.get("stats"), dict):
+                stats_ring.append(time.time(), json_data["stats"])
+
+            bridge.resolve(json_data)
 
     except WebSocketDisconnect:
         print("Websocket disconnected")
-        plugin_ws = None
+    finally:
+        bridge.detach(websocket)
 
 @router.websocket("/ws/server_logs")
-async def dashboard_ws(websocket: WebSocket):
+async def dashboard_ws(websocket: WebSocket, offset: Optional[int] = None, since: Optional[float] = None, until: Optional[float] = None, limit: int = MAX_LOG_REPLAY):
     await websocket.accept()
-    for log in pending_logs:
-        await websocket.send_text(json.dumps({"log": log}))
 
-    dashboard_clients.append(websocket)
+    limit = max(0, min(limit, MAX_LOG_REPLAY))
+    if offset is None and since is None:
+        backlog = list(log_archive.tail)
+    else:
+        # Older ranges come off disk; read them without blocking the event loop
+        backlog = await run_blocking(log_archive.replay, start_offset=offset, since=since, until=until, limit=limit)
+        # Lines archived while the replay ran are not in it yet, and arrived before this client was registered
+        if until is None and len(backlog) < limit:
+            last = backlog[-1][0] if backlog else (offset or 0) - 1
+            backlog.extend(entry for entry in list(log_archive.tail) if entry[0] > last and entry[1] >= (since or 0))
+
+    log_broadcaster.add(websocket, [log_payload(entry) for entry in backlog])
 
     try:
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        dashboard_clients.remove(websocket)
+        pass
+    finally:
+        log_broadcaster.remove(websocket)
 
 
 async def send_request_to_plugin(request_data):
-    if plugin_ws is None:
-        raise Exception("No plugin connected")
-
-    request_id = str(uuid.uuid4())
-    request_data["request_id"] = request_id
-    fut = asyncio.get_event_loop().create_future()
-    pending_requests[request_id] = fut
-
-    await plugin_ws.send_text(json.dumps(request_data))
-
+    return await bridge.request(request_data)
+
+# Plugin actions allowed in /mc/batch and the fields each one needs
+BATCH_ACTIONS = {
+    "add_whitelist": ("player",),
+    "remove_whitelist": ("player",),
+    "add_op": ("player",),
+    "remove_op": ("player",),
+    "delete_player": ("player",),
+    "update_player": ("player", "new_data"),
+    "send_command": ("command",)
+}
+MAX_BATCH_SIZE = int(os.getenv("MC_BATCH_MAX", 1000))
+# Kept below MC_MAX_IN_FLIGHT so single requests still get through during a batch
+BATCH_CONCURRENCY = int(os.getenv("MC_BATCH_CONCURRENCY", 32))
+
+async def _run_batch_item(index: int, item: PluginAction, slots: asyncio.Semaphore) -> dict:
+    request_data = {"action": item.action}
+    for field in BATCH_ACTIONS[item.action]:
+        request_data[field] = getattr(item, field)
+
+    result = {"index": index, "action": item.action}
+    if item.player is not None:
+        result["player"] = item.player
+
+    async with slots:
+        try:
+            result["response"] = await send_request_to_plugin(request_data)
+            result["ok"] = True
+        except Exception as e:
+            result["error"] = str(e)
+            result["ok"] = False
+    return result
+
+async def _stream_batch(actions: list[PluginAction]):
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks = [asyncio.create_task(_run_batch_item(index, item, slots)) for index, item in enumerate(actions)]
+    succeeded = 0
     try:
-        response = await asyncio.wait_for(fut, timeout=30.0)
-        return response
-    
-    except asyncio.TimeoutError:
-        pending_requests.pop(request_id, None)
-        raise Exception("Request timed out")
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            succeeded += result["ok"]
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"done": True, "ok": succeeded, "failed": len(tasks) - succeeded}) + "\n"
+    finally:
+        # The client went away: don't keep sending its actions to the plugin
+        for task in tasks:
+            task.cancel()
 
 def get_playerid(user: UserData) -> str:
     return user.player_id
@@ -101,7 +192,7 @@ async def get_playername(user: UserData) -> str:
 @router.get("/get-server-ip")
 async def reveal_ip():
     try:
-        response = await send_request_to_plugin({"action": "get_ip"})
+        response = await plugin_cache.get("get_ip")
         return {"status": response}
 
     except Exception as e:
@@ -110,7 +201,7 @@ async def reveal_ip():
 @router.get("/player-count")
 async def player_count():
     try:
-        response = await send_request_to_plugin({"action": "get_player_count"})
+        response = await plugin_cache.get("get_player_count")
         return {"status": response}
     
     except Exception as e:
@@ -119,7 +210,7 @@ async def player_count():
 @router.get("/get-server-stats")
 async def server_stats():
     try:
-        response = await send_request_to_plugin({"action": "get_server_stats"})
+        response = await plugin_cache.get("get_server_stats")
         return {"status": response}
     
     except Exception as e:
@@ -138,58 +229,95 @@ async def server_stats():
                 }
            }
 
+@router.get("/mc/stats/latest")
+async def get_mc_stats_latest(admin_id: str = Depends(require_admin)):
+
+    return {"stats": stats_ring.latest()}
+
+@router.get("/mc/stats/history")
+async def get_mc_stats_history(resolution: str = "1m", admin_id: str = Depends(require_admin)):
+
+    if resolution not in STATS_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(STATS_RESOLUTIONS)}")
+
+    bucket, window = STATS_RESOLUTIONS[resolution]
+    return {"resolution": resolution, "history": stats_ring.downsample(bucket, time.time() - window)}
+
+@router.get("/mc/logs/search")
+async def search_mc_logs(q: str = "", level: Optional[str] = None, player: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None, before: Optional[int] = None, limit: int = 100, admin_id: str = Depends(require_admin)):
+
+    limit = max(1, min(limit, MAX_LOG_SEARCH))
+    results, next_before = await run_blocking(log_index.search, q, level=level, player=player, since=since, until=until, before=before, limit=limit)
+    return {
+        "logs": [{"log": line, "offset": offset, "time": timestamp} for offset, timestamp, line in results],
+        "next": next_before
+    }
+
+@router.post("/mc/batch")
+async def run_mc_batch(batch: PluginBatch, request: Request):
+    await require_admin(request, batch.admin_id)
+
+    if not batch.actions or len(batch.actions) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch must contain between 1 and {MAX_BATCH_SIZE} actions")
+
+    for index, item in enumerate(batch.actions):
+        if item.action not in BATCH_ACTIONS:
+            raise HTTPException(status_code=400, detail=f"Action {index}: '{item.action}' cannot be batched")
+        missing = [field for field in BATCH_ACTIONS[item.action] if getattr(item, field) is None]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Action {index}: missing {', '.join(missing)}")
+
+    if not bridge.connected:
+        raise HTTPException(status_code=503, detail="No plugin connected")
+
+    # One NDJSON line per action as it completes, then a summary line
+    return StreamingResponse(_stream_batch(batch.actions), media_type="application/x-ndjson")
+
 @router.get("/mc/status")
-async def get_mc_status(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def get_mc_status(admin_id: str = Depends(require_admin)):
     
     try:
-        response = await send_request_to_plugin({"action": "get_status"})
+        response = await plugin_cache.get("get_status")
         return {"status": response}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/mc/start")
-async def start_mc_server(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def start_mc_server(admin_id: str = Depends(require_admin)):
     
     try:
         response = await send_request_to_plugin({"action": "start_server"})
+        plugin_cache.invalidate()
         return {"status": response}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/mc/stop")
-async def stop_mc_server(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def stop_mc_server(admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "stop_server"})
+        plugin_cache.invalidate()
         return {"status": response}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/mc/restart")
-async def restart_mc_server(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def restart_mc_server(admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "restart_server"})
+        plugin_cache.invalidate()
         return {"status": response}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/mc/command")
-async def send_mc_command(admin_id: str, command: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def send_mc_command(command: str, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "send_command", "command": command})
@@ -199,21 +327,17 @@ async def send_mc_command(admin_id: str, command: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/mc/players")
-async def get_mc_players(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def get_mc_players(admin_id: str = Depends(require_admin)):
 
     try:
-        response = await send_request_to_plugin({"action": "get_players"})
+        response = await plugin_cache.get("get_players")
         return {"players": response}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
         
 @router.post("/mc/whitelist/get")
-async def get_mc_whitelist(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def get_mc_whitelist(admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "get_whitelist"})
@@ -223,9 +347,7 @@ async def get_mc_whitelist(admin_id: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/mc/whitelist/add")
-async def add_mc_whitelist(admin_id: str, player: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def add_mc_whitelist(player: str, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "add_whitelist", "player": player})
@@ -235,9 +357,7 @@ async def add_mc_whitelist(admin_id: str, player: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/mc/whitelist/remove")
-async def remove_mc_whitelist(admin_id: str, player: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def remove_mc_whitelist(player: str, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "remove_whitelist", "player": player})
@@ -247,9 +367,7 @@ async def remove_mc_whitelist(admin_id: str, player: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/mc/whitelist/enable")
-async def enable_mc_whitelist(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def enable_mc_whitelist(admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "enable_whitelist"})
@@ -259,9 +377,7 @@ async def enable_mc_whitelist(admin_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/mc/whitelist/disable")
-async def disable_mc_whitelist(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def disable_mc_whitelist(admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "disable_whitelist"})
@@ -271,9 +387,7 @@ async def disable_mc_whitelist(admin_id: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/mc/backup")
-async def backup_mc_server(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def backup_mc_server(admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "backup_server"})
@@ -283,9 +397,7 @@ async def backup_mc_server(admin_id: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/mc/backups")
-async def list_mc_backups(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def list_mc_backups(admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "list_backups"})
@@ -295,9 +407,7 @@ async def list_mc_backups(admin_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/mc/op/add")
-async def add_mc_op(admin_id: str, player: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def add_mc_op(player: str, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "add_op", "player": player})
@@ -307,9 +417,7 @@ async def add_mc_op(admin_id: str, player: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/mc/op/remove")
-async def remove_mc_op(admin_id: str, player: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def remove_mc_op(player: str, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "remove_op", "player": player})
@@ -319,9 +427,7 @@ async def remove_mc_op(admin_id: str, player: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/mc/op/list")
-async def list_mc_op(admin_id: str, player: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def list_mc_op(player: str, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "list_op"})
@@ -331,9 +437,7 @@ async def list_mc_op(admin_id: str, player: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/mc/player-data/delete")
-async def get_mc_whitelist(admin_id: str, player: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def get_mc_whitelist(player: str, admin_id: str = Depends(require_admin)):
 
     try: 
         response = await send_request_to_plugin({"action": "delete_player", "player": player})
@@ -343,9 +447,7 @@ async def get_mc_whitelist(admin_id: str, player: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/mc/server-properties/update")
-async def update_mc_server_properties(admin_id: str, new_properties: dict):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def update_mc_server_properties(new_properties: dict, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "update_server_properties", "new_properties": new_properties})
@@ -355,9 +457,7 @@ async def update_mc_server_properties(admin_id: str, new_properties: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/mc/server-properties/get")
-async def get_mc_server_properties(admin_id: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def get_mc_server_properties(admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "get_server_properties"})
@@ -367,9 +467,7 @@ async def get_mc_server_properties(admin_id: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/mc/world/backup")
-async def backup_mc_world(admin_id: str, world_name: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def backup_mc_world(world_name: str, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "backup_world", "world_name": world_name})
@@ -379,9 +477,7 @@ async def backup_mc_world(admin_id: str, world_name: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/mc/world/backups")
-async def list_mc_world_backups(admin_id: str, world_name: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def list_mc_world_backups(world_name: str, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "list_world_backups", "world_name": world_name})
@@ -391,9 +487,7 @@ async def list_mc_world_backups(admin_id: str, world_name: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/mc/world/restore")
-async def restore_mc_world(admin_id: str, world_name: str, backup_name: str):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def restore_mc_world(world_name: str, backup_name: str, admin_id: str = Depends(require_admin)):
 
     try:
         response = await send_request_to_plugin({"action": "restore_world", "world_name": world_name, "backup_name": backup_name})
@@ -403,9 +497,7 @@ async def restore_mc_world(admin_id: str, world_name: str, backup_name: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/mc/player-data/modify")
-async def modify_mc_player_data(admin_id: str, player: str, new_data: dict):
-    if verify_admin(admin_id) is False:
-        raise HTTPException(status_code=403, detail="Unauthorized")
+async def modify_mc_player_data(player: str, new_data: dict, admin_id: str = Depends(require_admin)):
     
     try:
         response = await send_request_to_plugin({"action": "update_player", "player": player, "new_data": new_data})
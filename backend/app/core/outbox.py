@@ -0,0 +1,179 @@
+# app/core/outbox.py
+
+from typing import Callable, List, Optional
+import json
+import random
+import sqlite3
+import threading
+import time
+
+# Returns one entry per message: None if it was accepted, or a permanent error.
+# Raising means the whole batch failed and is retried later.
+BatchSender = Callable[[List[dict]], List[Optional[str]]]
+# How long a write waits for another process to release the database lock
+LOCK_TIMEOUT = 30.0
+
+class MailOutbox:
+    """
+    Durable outgoing mail queue in a local SQLite file. Callers enqueue and
+    return at once; a background thread sends due messages in batches of up
+    to `batch_size`, retrying failed batches with exponential backoff. A
+    message that is rejected, or still failing after `max_attempts`, is kept
+    as dead for inspection instead of being retried forever.
+
+    Every worker process runs its own sender on the same file. A batch is
+    claimed before it is sent by pushing its next_attempt `lease` seconds
+    ahead, so no other sender picks it up; if the claiming process dies
+    mid-send, the messages come due again once the lease runs out.
+    """
+
+    def __init__(self, path: str, sender: BatchSender, batch_size: int, interval: float, max_attempts: int, backoff: float, max_backoff: float, lease: float):
+        self.sender = sender
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.sent = 0
+        self.batches = 0
+        self.failed_attempts = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self._db = sqlite3.connect(path, timeout=LOCK_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # With WAL this only risks the last few commits on power loss, not corruption
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message TEXT NOT NULL,
+                created REAL NOT NULL,
+                next_attempt REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                dead INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (dead, next_attempt)")
+
+    def enqueue(self, message: dict) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO outbox (message, created, next_attempt) VALUES (?, ?, ?)", (json.dumps(message), now, now))
+        self._wake.set()
+        return cursor.lastrowid
+
+    def _claim(self) -> List[tuple]:
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two processes cannot select the same rows
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, message, attempts FROM outbox WHERE dead = 0 AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                    (now, self.batch_size)
+                ).fetchall()
+                self._db.executemany("UPDATE outbox SET next_attempt = ? WHERE id = ?", [(now + self.lease, row[0]) for row in rows])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def send_due(self) -> int:
+        """
+        Send one batch of due messages; return how many were taken off the queue.
+        """
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        self.batches += 1
+        try:
+            errors = self.sender([json.loads(message) for _, message, _ in rows])
+            if len(errors) != len(rows):
+                raise ValueError(f"Expected {len(rows)} results, got {len(errors)}")
+        except Exception as e:
+            self.failed_attempts += len(rows)
+            self._reschedule(rows, str(e))
+            return 0
+
+        with self._lock:
+            for (row_id, _, attempts), error in zip(rows, errors):
+                if error is None:
+                    self._db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+                    self.sent += 1
+                else:
+                    print(f"Mail {row_id} rejected: {error}")
+                    self._db.execute("UPDATE outbox SET dead = 1, attempts = ?, last_error = ? WHERE id = ?", (attempts + 1, error, row_id))
+        return len(rows)
+
+    def _reschedule(self, rows: List[tuple], error: str):
+        print(f"Mail batch failed, will retry: {error}")
+        with self._lock:
+            for row_id, _, attempts in rows:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    self._db.execute("UPDATE outbox SET dead = 1, attempts = ?, last_error = ? WHERE id = ?", (attempts, error, row_id))
+                else:
+                    self._db.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                        (attempts, time.time() + self._retry_delay(attempts), error, row_id)
+                    )
+
+    def _run(self):
+        errors = 0
+        while not self._stopped.is_set():
+            try:
+                taken = self.send_due()
+                errors = 0
+            except Exception as e:
+                # e.g. the database stayed locked; keep the thread alive and back off instead of spinning
+                errors += 1
+                print(f"Error sending mail: {e}")
+                self._wake.wait(self._retry_delay(errors))
+                self._wake.clear()
+                continue
+
+            # Keep draining while full batches go out; otherwise wait for new mail or a retry to come due
+            if taken < self.batch_size:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="mail-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending, due, dead, oldest = self._db.execute(
+                "SELECT SUM(dead = 0), SUM(dead = 0 AND next_attempt <= ?), SUM(dead = 1), MIN(CASE WHEN dead = 0 THEN created END) FROM outbox",
+                (time.time(),)
+            ).fetchone()
+
+        return {
+            "pending": pending or 0,
+            "due": due or 0,
+            "dead": dead or 0,
+            "oldest_pending_seconds": time.time() - oldest if oldest is not None else None,
+            "sent": self.sent,
+            "batches": self.batches,
+            "failed_attempts": self.failed_attempts
+        }
@@ -0,0 +1,189 @@
+# app/core/ratelimit.py
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs
+import json
+import math
+import os
+import time
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+# Only trust X-Forwarded-For behind a proxy that sets it
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+RATE_LIMIT_SHARDS = 16
+RATE_LIMIT_SWEEP_INTERVAL = 5.0
+
+class RatePolicy(NamedTuple):
+    rate: float     # tokens added per second
+    burst: int      # bucket size
+    key: str        # "ip", "user" (falls back to ip) or "ip+user"
+
+def per_minute(count: float, burst: int, key: str = "ip") -> RatePolicy:
+    return RatePolicy(rate=count / 60, burst=burst, key=key)
+
+# Path: policy. Everything else falls under DEFAULT_POLICY.
+ROUTE_POLICIES = {
+    "/login/ppsecure": per_minute(5, 10),
+    "/admin/login/ppsecure": per_minute(5, 10),
+    "/register/ppsecure": per_minute(3, 5),
+    "/admin/register/ppsecure": per_minute(3, 5),
+    "/register/request_confirm_email": per_minute(1, 3, "ip+user"),
+    "/login/req-psw-reset": per_minute(1, 3, "ip+user"),
+    "/register/confirm_email": per_minute(10, 10, "user"),
+    "/login/validate-psw-reset": per_minute(10, 10, "user"),
+    "/login/forget-psw": per_minute(5, 5, "user"),
+    "/get-server-stats": RatePolicy(rate=2, burst=20, key="ip"),
+    "/player-count": RatePolicy(rate=2, burst=20, key="ip"),
+    "/get-server-ip": RatePolicy(rate=2, burst=20, key="ip")
+}
+DEFAULT_POLICY = RatePolicy(rate=float(os.getenv("RATE_LIMIT_DEFAULT_RATE", 20)), burst=int(os.getenv("RATE_LIMIT_DEFAULT_BURST", 100)), key="ip")
+
+class TokenBuckets:
+    """
+    Token buckets spread over `shards` dicts. A bucket is refilled only when
+    it is touched; a bucket that has been idle long enough to be full again
+    is indistinguishable from a new one, so sweeps drop it, one shard per
+    `sweep_interval`. Runs on the event loop, so no locking.
+    """
+
+    def __init__(self, shards: int, sweep_interval: float):
+        self._shards: List[Dict[Tuple[str, str], List[float]]] = [{} for _ in range(shards)]
+        self.sweep_interval = sweep_interval
+        self.evicted = 0
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._sweep_shard = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def take(self, key: Tuple[str, str], policy: RatePolicy, now: float) -> float:
+        """
+        Take one token; return 0 if allowed, or the seconds until a token is available.
+        """
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        shard = self._shards[hash(key) % len(self._shards)]
+        bucket = shard.get(key)
+        if bucket is None:
+            # [tokens, last refill, seconds until full again]
+            bucket = shard[key] = [float(policy.burst), now, policy.burst / policy.rate]
+
+        tokens = min(policy.burst, bucket[0] + (now - bucket[1]) * policy.rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+
+        bucket[0] = tokens
+        return (1 - tokens) / policy.rate
+
+    def _sweep(self, now: float):
+        shard = self._shards[self._sweep_shard]
+        idle = [key for key, bucket in shard.items() if now - bucket[1] >= bucket[2]]
+        for key in idle:
+            del shard[key]
+        self.evicted += len(idle)
+        self._sweep_shard = (self._sweep_shard + 1) % len(self._shards)
+        self._next_sweep = now + self.sweep_interval
+
+class RateLimiter:
+    """
+    Per-route token-bucket policies. Listed routes get their own buckets;
+    every other route shares one `default` bucket per client.
+    """
+
+    def __init__(self, policies: Dict[str, RatePolicy], default: Optional[RatePolicy], enabled: bool, trust_proxy: bool):
+        self.policies = policies
+        self.default = default
+        self.enabled = enabled
+        self.trust_proxy = trust_proxy
+        self.buckets = TokenBuckets(shards=RATE_LIMIT_SHARDS, sweep_interval=RATE_LIMIT_SWEEP_INTERVAL)
+        self.allowed = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _client_ip(self, scope: Scope) -> str:
+        if self.trust_proxy:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _key(self, scope: Scope, route: str, policy: RatePolicy) -> Tuple[str, str]:
+        ip = self._client_ip(scope)
+        if policy.key == "ip":
+            return route, ip
+
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        user = (query.get("user_id") or query.get("admin_id") or [None])[0]
+        if user is None:
+            return route, ip
+        if policy.key == "user":
+            return route, f"user:{user}"
+        return route, f"{ip}|{user}"
+
+    def check(self, scope: Scope) -> float:
+        """
+        Return 0 if the request may proceed, otherwise the seconds to wait.
+        """
+        if not self.enabled:
+            return 0.0
+
+        route = scope["path"]
+        policy = self.policies.get(route)
+        if policy is None:
+            route, policy = "*", self.default
+        if policy is None:
+            return 0.0
+
+        wait = self.buckets.take(self._key(scope, route, policy), policy, time.monotonic())
+        if wait == 0:
+            self.allowed += 1
+        else:
+            self.rejected[route] = self.rejected.get(route, 0) + 1
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "buckets": len(self.buckets),
+            "evicted": self.buckets.evicted,
+            "allowed": self.allowed,
+            "rejected": dict(self.rejected)
+        }
+
+class RateLimitMiddleware:
+    """
+    Answers over-limit HTTP requests with a 429 before they reach the app.
+    Websockets are not limited.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        wait = self.limiter.check(scope)
+        if wait == 0:
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps({"detail": {"error": "Too many requests, please slow down"}}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(wait)).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+rate_limiter = RateLimiter(policies=ROUTE_POLICIES, default=DEFAULT_POLICY, enabled=RATE_LIMIT_ENABLED, trust_proxy=RATE_LIMIT_TRUST_PROXY)
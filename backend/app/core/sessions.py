@@ -0,0 +1,124 @@
+# app/core/sessions.py
+
+from app.core.db import db
+from typing import Dict, Optional
+import os
+import threading
+import time
+import uuid
+import jwt
+
+# Shared by every worker, so a token issued by one is accepted by the others and survives restarts
+ADMIN_TOKEN_SECRET = os.getenv("ADMIN_TOKEN_SECRET")
+if not ADMIN_TOKEN_SECRET:
+    raise ValueError("ADMIN_TOKEN_SECRET must be set in environment variables.")
+ADMIN_TOKEN_TTL = int(os.getenv("ADMIN_TOKEN_TTL", 900))
+ADMIN_REVOCATION_REFRESH = float(os.getenv("ADMIN_REVOCATION_REFRESH", 30))
+# One document per admin, {"revoked_before": <unix time>}: tokens issued earlier are rejected
+REVOCATIONS_COLLECTION = "admin_revocations"
+TOKEN_ALGORITHM = "HS256"
+
+class AdminSessions:
+    """
+    Issues and checks signed admin session tokens. Checking a token is a local
+    signature and expiry check plus a lookup in an in-memory revocation list;
+    the list is re-read from Firestore every `refresh_interval` seconds by a
+    background thread, and revocations made by this process apply at once.
+    """
+
+    def __init__(self, secret: str, ttl: int, refresh_interval: float):
+        self.secret = secret
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.issued = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.refreshed_at: Optional[float] = None
+        self._revoked_before: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def issue(self, admin_id: str, role: str, probation: bool) -> str:
+        now = time.time()
+        self.issued += 1
+        return jwt.encode({
+            "sub": admin_id,
+            "role": role,
+            "probation": probation,
+            "iat": now,
+            "exp": int(now) + self.ttl,
+            "jti": str(uuid.uuid4())
+        }, self.secret, algorithm=TOKEN_ALGORITHM)
+
+    def verify(self, token: str) -> Optional[dict]:
+        """
+        Return the token's claims if it is genuine, unexpired, not revoked and
+        not held by an admin on probation; otherwise None.
+        """
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[TOKEN_ALGORITHM], options={"require": ["sub", "iat", "exp"]})
+        except jwt.InvalidTokenError:
+            self.rejected += 1
+            return None
+
+        if claims.get("probation") or claims["iat"] < self._revoked_before.get(claims["sub"], 0):
+            self.rejected += 1
+            return None
+
+        self.accepted += 1
+        return claims
+
+    def revoke(self, admin_id: str):
+        revoked_before = time.time()
+        with self._lock:
+            self._revoked_before[admin_id] = revoked_before
+        db.collection(REVOCATIONS_COLLECTION).document(admin_id).set({"revoked_before": revoked_before})
+
+    def refresh(self):
+        revoked = {}
+        for doc in db.collection(REVOCATIONS_COLLECTION).stream():
+            revoked_before = doc.to_dict().get("revoked_before")
+            # Once every token issued before the cut-off has expired, the entry is no longer needed
+            if revoked_before is None or revoked_before + self.ttl < time.time():
+                doc.reference.delete()
+                continue
+            revoked[doc.id] = revoked_before
+
+        with self._lock:
+            for admin_id, revoked_before in self._revoked_before.items():
+                if revoked_before > revoked.get(admin_id, 0) and revoked_before + self.ttl >= time.time():
+                    revoked[admin_id] = revoked_before
+            self._revoked_before = revoked
+        self.refreshed_at = time.time()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing admin revocations: {e}")
+            self._stopped.wait(self.refresh_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="admin-revocations", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "issued": self.issued,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "revoked_admins": len(self._revoked_before),
+            "refreshed_at": self.refreshed_at
+        }
+
+admin_sessions = AdminSessions(secret=ADMIN_TOKEN_SECRET, ttl=ADMIN_TOKEN_TTL, refresh_interval=ADMIN_REVOCATION_REFRESH)
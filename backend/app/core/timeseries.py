@@ -0,0 +1,83 @@
+# app/core/timeseries.py
+
+from array import array
+from typing import Dict, List, Optional
+import bisect
+import math
+
+class StatsRing:
+    """
+    Fixed-capacity time series backed by one array("d") per field. Once full,
+    each new sample overwrites the oldest; nothing is allocated per sample.
+    Samples must be appended in time order.
+    """
+
+    def __init__(self, fields: List[str], capacity: int):
+        self.fields = fields
+        self.capacity = capacity
+        self._times = array("d", [0.0]) * capacity
+        self._values: Dict[str, array] = {field: array("d", [math.nan]) * capacity for field in fields}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, timestamp: float, sample: dict):
+        slot = self._count % self.capacity
+        self._times[slot] = timestamp
+        for field in self.fields:
+            try:
+                self._values[field][slot] = float(sample.get(field))
+            except (TypeError, ValueError):
+                self._values[field][slot] = math.nan
+        self._count += 1
+
+    def _row(self, index: int) -> dict:
+        slot = index % self.capacity
+        row = {"time": self._times[slot]}
+        for field in self.fields:
+            value = self._values[field][slot]
+            row[field] = None if math.isnan(value) else value
+        return row
+
+    def latest(self) -> Optional[dict]:
+        if self._count == 0:
+            return None
+        return self._row(self._count - 1)
+
+    def downsample(self, bucket_seconds: float, since: float) -> List[dict]:
+        # Logical indices run from the oldest retained sample to the newest
+        first = max(0, self._count - self.capacity)
+        start = bisect.bisect_left(range(first, self._count), since, key=lambda index: self._times[index % self.capacity]) + first
+
+        buckets: List[dict] = []
+        sums: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        current = None
+
+        def close():
+            row = {"time": current}
+            for field in self.fields:
+                row[field] = sums[field] / counts[field] if counts[field] else None
+            buckets.append(row)
+
+        for index in range(start, self._count):
+            slot = index % self.capacity
+            bucket = self._times[slot] - self._times[slot] % bucket_seconds
+            if bucket != current:
+                if current is not None:
+                    close()
+                current = bucket
+                sums = dict.fromkeys(self.fields, 0.0)
+                counts = dict.fromkeys(self.fields, 0)
+
+            for field in self.fields:
+                value = self._values[field][slot]
+                if not math.isnan(value):
+                    sums[field] += value
+                    counts[field] += 1
+
+        if current is not None:
+            close()
+
+        return buckets
@@ -0,0 +1,83 @@
+# app/core/transports.py
+
+from collections import deque
+from typing import Dict, List, Optional
+import json
+import os
+import threading
+import time
+import requests
+
+def parse_send_response(status_code: int, body: dict) -> List[Optional[str]]:
+    """
+    Read a Mailjet v3.1 send response. Errors worth retrying raise; each
+    message gets None if accepted, or its error if it was rejected.
+    """
+    if status_code == 429 or status_code >= 500 or status_code in (401, 403):
+        raise Exception(f"Mail API returned {status_code}")
+
+    return [
+        None if status.get("Status") == "success" else json.dumps(status.get("Errors", status))
+        for status in body.get("Messages", [])
+    ]
+
+class MailjetTransport:
+    def __init__(self, api_key: str, api_secret: str):
+        from mailjet_rest import Client
+
+        self.client = Client(auth=(api_key, api_secret), version="v3.1")
+
+    def send(self, messages: List[Dict]) -> List[Optional[str]]:
+        result = self.client.send.create(data={"Messages": messages})
+        return parse_send_response(result.status_code, result.json())
+
+class HttpTransport:
+    """
+    Posts Mailjet-shaped batches to any URL, e.g. the fake server in bench_mail.py.
+    """
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, messages: List[Dict]) -> List[Optional[str]]:
+        result = self.session.post(self.url, json={"Messages": messages}, timeout=self.timeout)
+        return parse_send_response(result.status_code, result.json())
+
+class MemoryTransport:
+    """
+    Accepts everything and keeps the last `keep` messages, for local runs and load tests.
+    """
+
+    def __init__(self, keep: int = 1000):
+        self.sent: deque = deque(maxlen=keep)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def send(self, messages: List[Dict]) -> List[Optional[str]]:
+        now = time.time()
+        with self._lock:
+            for message in messages:
+                self.sent.append((now, message))
+            self.count += len(messages)
+        return [None] * len(messages)
+
+def make_transport(name: str):
+    if name == "memory":
+        return MemoryTransport()
+
+    if name == "http":
+        url = os.getenv("MAIL_HTTP_URL")
+        if not url:
+            raise ValueError("MAIL_HTTP_URL must be set when MAIL_TRANSPORT is http.")
+        return HttpTransport(url)
+
+    if name == "mailjet":
+        api_key = os.getenv("MAILJET_API_KEY")
+        api_secret = os.getenv("MAILJET_SECRET_KEY")
+        if api_key is None or api_secret is None:
+            raise ValueError("MAILJET_API_KEY and MAILJET_SECRET_KEY must be set in environment variables.")
+        return MailjetTransport(api_key, api_secret)
+
+    raise ValueError(f"Unknown MAIL_TRANSPORT {name!r}, expected mailjet, memory or http.")
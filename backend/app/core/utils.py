@@ -2,21 +2,29 @@
 
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse, RedirectResponse
-from app.core.mail import send_html_email
+from app.core.mail import send_rendered_email
+from app.core.email_templates import CONFIRM_EMAIL, PASSWORD_RESET, code_boxes
 from app.models.util_model import UserData
 from app.models.user_model import RegisterForm, LoginForm
 from app.models.admin_models import AdminData, AdminRegisterForm, AdminLoginForm
 from app.core.db import db
+from app.core.cache import TTLCache
+from app.core.codes import CODE_EXPIRED, CODE_OK, code_store
+from app.core.hashing import bcrypt_pool
+from app.core.sessions import admin_sessions
 from datetime import datetime, date, timedelta
 from deep_translator import GoogleTranslator
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.api_core.exceptions import AlreadyExists, NotFound
+from urllib.parse import quote
 import os
 import filetype
 import random
 import requests
 import json
 import base64
-import bcrypt
 import uuid
 
 DISCORD_API_URL= "https://discord.com/api"
@@ -24,6 +32,24 @@ CLIENT_ID = os.getenv("CLIENT_KEY")
 CLIENT_SECRET_KEY = os.getenv("CLIENT_SECRET_KEY")
 REDIRECT_URI = "http://localhost:5729/login/auth/discord/callback"
 OAUTH_SCOPE = "identify email"
+UNKNOWN_USERNAME = "Unknown user"
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 4096))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", 60))
+
+user_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+admin_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+email_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+
+# Called with an admin id whenever that admin's profile is written
+admin_listeners: List[Callable[[str], None]] = []
+
+# Email indexes: one document per normalized address, {"uuid": <account id>}
+USER_EMAIL_INDEX = "emails"
+ADMIN_EMAIL_INDEX = "admin_emails"
 
 
 BADGE_RULES = {
@@ -31,11 +57,41 @@ BADGE_RULES = {
 }
 
 def hash_password(password: str) -> str:
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode(), salt).decode()
+    return bcrypt_pool.hash(password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+    return bcrypt_pool.verify(password, hashed)
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        values = None
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail={"error": "Invalid cursor"})
+
+    return values
+
+def paginate(query, order_fields: List[str], limit: int, after: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    # The document id is the final sort key so that the order is total and cursors are stable
+    keys = order_fields + [FieldPath.document_id()]
+    for key in keys:
+        query = query.order_by(key)
+
+    if after:
+        query = query.start_after(dict(zip(keys, decode_cursor(after, len(keys)))))
+
+    docs = list(query.limit(limit + 1).stream())
+    if len(docs) <= limit:
+        return docs, None
+
+    docs = docs[:limit]
+    last = docs[-1].to_dict() or {}
+    return docs, encode_cursor([last.get(field) for field in order_fields] + [docs[-1].id])
 
 def generate_uuid():
     return str(uuid.uuid4())
@@ -131,7 +187,7 @@ def image_to_dataurl(image) -> str:
         raise ValueError("Could not determine image type or file is not an image")
 
     b64_str = base64.b64encode(image_bytes).decode('utf-8')
-    return f"data:image/{image_type};base64,{b64_str}"
+    return f"data:{kind.mime};base64,{b64_str}"
 
 def dataurl_to_image(dataurl: str) -> bytes:
     import base64
@@ -223,6 +279,115 @@ def verify_admin(admin_id: str) -> bool:
     
     return False 
 
+def notify_admin_changed(admin_id: str):
+    for listener in admin_listeners:
+        listener(admin_id)
+
+def load_profile(cache: TTLCache, collection: str, uuid: str, fresh: bool = False) -> Optional[dict]:
+    # Credential checks pass fresh=True: a password changed on another worker must apply at once
+    profile = None if fresh else cache.get(uuid)
+    if profile is None:
+        token = cache.token()
+        profile = db.collection(collection).document(uuid).get().to_dict()
+        if profile is None:
+            return None
+
+        cache.set(uuid, profile, token)
+
+    return dict(profile)
+
+def profile_cache_stats() -> dict:
+    return {"users": user_cache.stats(), "admins": admin_cache.stats(), "emails": email_cache.stats()}
+
+def email_key(email: str) -> str:
+    return quote(email.strip().lower(), safe="@")
+
+def lookup_email(index: str, email: str) -> Optional[str]:
+    key = email_key(email)
+    uuid = email_cache.get((index, key))
+    if uuid is not None:
+        return uuid
+
+    token = email_cache.token()
+    doc = db.collection(index).document(key).get()
+    if not doc.exists:
+        # Every account is indexed (see migrate_emails.py), so a miss means no such account
+        return None
+
+    uuid = doc.get("uuid")
+    email_cache.set((index, key), uuid, token)
+    return uuid
+
+def backfill_email_index(index: str, collection: str, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Index every account in `collection` that has no entry in `index` yet.
+    Safe to run more than once; addresses already indexed to another account
+    are reported as conflicts and left alone.
+    """
+    indexed = {doc.id: doc.get("uuid") for doc in db.collection(index).stream()}
+    added = 0
+    conflicts = []
+
+    for account in db.collection(collection).stream():
+        email = (account.to_dict() or {}).get("email")
+        if not email:
+            continue
+
+        key = email_key(email)
+        if key in indexed:
+            if indexed[key] != account.id:
+                conflicts.append((email, account.id, indexed[key]))
+            continue
+
+        indexed[key] = account.id
+        added += 1
+        if not dry_run:
+            try:
+                db.collection(index).document(key).create({"uuid": account.id})
+            except AlreadyExists:
+                # Indexed by a registration since the index was read
+                indexed[key] = db.collection(index).document(key).get().get("uuid")
+                if indexed[key] != account.id:
+                    conflicts.append((email, account.id, indexed[key]))
+                added -= 1
+
+    return {"index": index, "added": added, "conflicts": conflicts}
+
+def register_email(index: str, email: str, account_ref, account_data: dict) -> bool:
+    # create() fails if the address is already indexed, and the batch is all-or-nothing
+    batch = db.batch()
+    batch.create(db.collection(index).document(email_key(email)), {"uuid": account_ref.id})
+    batch.set(account_ref, account_data)
+    try:
+        batch.commit()
+    except AlreadyExists:
+        return False
+
+    return True
+
+def resolve_usernames(user_ids: Iterable[str]) -> Dict[str, str]:
+    usernames = {}
+    missing = []
+    for user_id in {str(user_id) for user_id in user_ids}:
+        profile = user_cache.get(user_id)
+        if profile is None:
+            missing.append(user_id)
+        else:
+            usernames[user_id] = profile.get("username", UNKNOWN_USERNAME)
+
+    if not missing:
+        return usernames
+
+    token = user_cache.token()
+    refs = [db.collection("users").document(user_id) for user_id in missing]
+    for snapshot in db.get_all(refs):
+        profile = snapshot.to_dict() if snapshot.exists else None
+        if profile is not None:
+            user_cache.set(snapshot.id, profile, token)
+            usernames[snapshot.id] = profile.get("username", UNKNOWN_USERNAME)
+
+    return usernames
+
 class User:
     def __init__(self):
         self.uuid = generate_uuid()
@@ -249,6 +414,7 @@ class User:
             return JSONResponse(status_code=404, content={"error": "Invalid user ID"})
 
         user.update(user_data)
+        user_cache.invalidate(self.uuid)
         return {"status": "success", "userdata": user_data}
 
     def add_user(self):
@@ -263,11 +429,13 @@ class User:
         }
 
         try:
-            existing_user = db.collection("users").where(field_path="email", op_string="==", value=self.email).get()
-            if existing_user:
+            if lookup_email(USER_EMAIL_INDEX, self.email) is not None:
                 return "Email already registered"
 
-            db.collection("users").document(self.uuid).set(user_data)
+            if not register_email(USER_EMAIL_INDEX, self.email, db.collection("users").document(self.uuid), user_data):
+                return "Email already registered"
+
+            user_cache.invalidate(self.uuid)
 
             self.request_confirm_email()
             return "success"
@@ -291,73 +459,27 @@ class User:
 
     def request_confirm_email(self):
         email_code = round(random.randint(100000, 999999))
+        code_store.issue("confirm_email", self.uuid, str(email_code))
         try:
-            existing_request = db.collection("email_codes").document(self.uuid)
-            if existing_request.get().exists:
-                existing_request.delete()
-
-            email_code_request = {
-                "id": self.uuid,
-                "datetime": datetime.now(),
-                "digits": email_code
-            }
-
-            db.collection("email_codes").document(self.uuid).set(email_code_request)
-
-            code_html = f"""<div style='display: flex;height: 61px;width: 249px;justify-content: space-between;align-items: center;flex-direction: row;line-height: 14px;'>{"".join(f"<div style='display: flex;height: 11px;padding: 19px 6px;border: 2px solid #6f67d9;border-radius: 7px;background-color: #f5f5f5;color: #000;font-size: 40px;'>{str(email_code)[i]}</div>" for i in range(len(str(email_code))))}</div>"""
-
-            html_content = [
-                {
-                    "type": "table",
-                    "content": [    
-                        {
-                            "type": "table",
-                            "content": [
-                                # {"type": "image", "content": "image/logo.png"},
-                                {"type": "header", "content": "Verify Your Email Address"},
-                                {"type": "text", "content": "We just need to verify your email address to activate your SurfNetwork account. Here's your verification code:"},
-                                {"type": "html", "content": code_html},
-                                {"type": "html", "content": "This code expires within 5 minutes"},
-                                {"type": "text", "content": "Only enter this code on the SurfNetwork website. Don't share it with anyone. We'll never ask for it outside any of our platforms."},
-                                {"type": "text", "content": "Welcome aboard!"},
-                                {"type": "text", "content": "SurfNetwork Team"}
-                            ]
-                        }
-                    ]
-                },
-                {
-                    "type": "table",
-                    "content": [
-                        {"type": "text", "content": "This email was sent to you by the SurfNetwork because you signed up for a SurfNetwork account.break-linePlease let us know if you feel that this email was sent to you by error."},
-                        {"type": "text", "content": "© 2025 SurfNetwork"},
-                        {"type": "list", "content": [
-                            {"type": "hyperlink", "content": "Privacy Policy", "link": "#"},
-                            {"type": "hyperlink", "content": "Personal Data Protection and Privacy Policy", "link": "#"},
-                            {"type": "hyperlink", "content": "Acceptable Use Policy", "link": "#"},
-                        ]}
-                    ]
-                }
-            ]
-
-            send_html_email(to_email=self.email, to_name=self.username, subject="Verify your email - SurfNetwork", html_content=html_content)
+            send_rendered_email(to_email=self.email, to_name=self.username, subject="Verify your email - SurfNetwork", template=CONFIRM_EMAIL, code_html=code_boxes(email_code))
 
         except Exception as e:
             raise HTTPException(status_code=500, detail={"error": str(e)})
 
     def from_login(self, form: LoginForm):
 
-        query = db.collection("users").where(field_path="email", op_string="==", value=form.email).get()
-        if not query:
+        uuid = lookup_email(USER_EMAIL_INDEX, form.email)
+        if uuid is None:
             raise HTTPException(status_code=404, detail={"error": "Invalid email, please register with this username"})
 
-        user_data = query[0].to_dict()
+        user_data = load_profile(user_cache, "users", uuid, fresh=True)
         if user_data is None:
             raise HTTPException(status_code=404, detail={"error": "User data not found"})
 
         if not verify_password(form.psw, user_data["psw"]):
             raise HTTPException(status_code=400, detail={"error": "Incorrect password"})
 
-        self.uuid = query[0].id
+        self.uuid = uuid
         self.username = user_data["username"]
         self.email = user_data["email"]
         self.psw = user_data["psw"]
@@ -382,11 +504,7 @@ class User:
 
     def fromUUID(self, uuid: str):
         self.uuid = uuid
-        query = db.collection("users").document(self.uuid).get()
-        if not query:
-            raise HTTPException(status_code=404, detail={"error": "Invalid user ID"})
-
-        user = query.to_dict()
+        user = load_profile(user_cache, "users", self.uuid)
         if user is None:
             raise HTTPException(status_code=500, detail={"error": "User data not found"})
         
@@ -417,118 +535,38 @@ class User:
 
     def request_password_reset(self):
         reset_code = random.randint(10000, 99999)
-        code_html = f"""<div style='display: flex;height: 61px;width: 249px;justify-content: space-between;align-items: center;flex-direction: row;line-height: 14px;'>{"".join(f"<div style='display: flex;height: 11px;padding: 19px 6px;border: 2px solid #6f67d9;border-radius: 7px;background-color: #f5f5f5;color: #000;font-size: 40px;'>{str(reset_code)[i]}</div>" for i in range(len(str(reset_code))))}</div>"""
-
-        html_content = [
-            {
-                "type": "table",
-                "content": [    
-                    {
-                        "type": "table",
-                        "content": [
-                            # {"type": "image", "content": "image/logo.png"},
-                            {"type": "header", "content": "Reset Your Password"},
-                            {"type": "text", "content": "We just need to verify it you before you can reset your password, here's your reset code:"},
-                            {"type": "html", "content": code_html},
-                            {"type": "html", "content": "This code expires within 5 minutes"},
-                            {"type": "text", "content": "Only enter this code on the SurfNetwork website or app. Don't share it with anyone. We'll never ask for it outside any of our platforms."},
-                            {"type": "text", "content": "If you see this email and you didn't request a password reset, click below to go to \"Acccount Management\" to secure your account"},
-                            {"type": "button", "content": "Account Management", "hyperlink": "#"}
-                        ]
-                    }
-                ]
-            },
-            {
-                "type": "table",
-                "content": [
-                    {"type": "text", "content": "This email was sent to you by SurfNetwork because you signed up for a SurfNetwork account.break-linePlease let us know if you feel that this email was sent to you by error."},
-                    {"type": "text", "content": "© 2025 SurfNetwork"},
-                    {"type": "list", "content": [
-                        {"type": "hyperlink", "content": "Privacy Policy", "link": "#"},
-                        {"type": "hyperlink", "content": "Personal Data Protection and Privacy Policy", "link": "#"},
-                        {"type": "hyperlink", "content": "Acceptable Use Policy", "link": "#"},
-                    ]}
-                ]
-            }
-        ]
-
-        send_html_email(to_email=self.email, to_name=self.username, subject="Verify your email - SurfNetwork", html_content=html_content)
-
-        user_reset_request = {
-            "datetime": datetime.now(),
-            "reset_code": reset_code
-        }
-
+        code_store.issue("password_reset", self.uuid, str(reset_code))
         try:
-            existing_request = db.collection("reset_psw_request").document(self.uuid)
-            if existing_request.get().exists:
-                existing_request.delete()
-
-            db.collection("reset_psw_request").document(self.uuid).set(user_reset_request)
-            
+            send_rendered_email(to_email=self.email, to_name=self.username, subject="Verify your email - SurfNetwork", template=PASSWORD_RESET, code_html=code_boxes(reset_code))
             return {"status": "success"}
         except Exception as e:
             return JSONResponse(status_code=500, content={"error": str(e)})
 
     def validate_password_request(self, reset_code: int):
-        reset_key = generate_uuid()
-        try:
-            code = self.fetch_data("reset_psw_request")
-
-            now = datetime.now()
-            minutes = now.minute - code["datetime"].minute - (now.second < code["datetime"].second)
-            if minutes >= 5:
-                return JSONResponse(status_code=400, content={"error": "Code expired, request another one"})
-            
-            else:
-                if code["reset_code"] == reset_code:
-                    try:
-                        user_reset_key = {
-                            "id": self.uuid,
-                            "datetime": datetime.now(),
-                            "reset_key": reset_key
-                        }
-
-                        existing_request = db.collection("reset_psw_key").document(self.uuid)
-                        if existing_request.get().exists:
-                            existing_request.delete()
-
-                        request = db.collection("reset_psw_key").document(self.uuid).set(user_reset_key)
-                        return {"status": "success", "reset_key": reset_key}
-
-                    except Exception as e:
-                        return JSONResponse(status_code=500, content={"error": str(e)})
-                                
-                else:
-                    return JSONResponse(status_code=400, content={"error": "Invalid code"})
+        result = code_store.consume("password_reset", self.uuid, str(reset_code))
+        if result == CODE_EXPIRED:
+            return JSONResponse(status_code=400, content={"error": "Code expired, request another one"})
+        if result != CODE_OK:
+            return JSONResponse(status_code=400, content={"error": "Invalid code"})
 
-        except Exception as e:
-            return JSONResponse(status_code=500, content={"error": str(e)})
+        reset_key = code_store.issue("password_reset_key", self.uuid, generate_uuid())
+        return {"status": "success", "reset_key": reset_key}
 
     def update_psw(self, change_key: str, new_password_unsafe: str):
-        new_password = hash_password(new_password_unsafe)
+        result = code_store.consume("password_reset_key", self.uuid, change_key)
+        if result == CODE_EXPIRED:
+            return JSONResponse(status_code=400, content={"error": "Session expired, request another one"})
+        if result != CODE_OK:
+            return JSONResponse(status_code=400, content={"error": "Invalid reset key"})
 
         try:
-            reset_key = self.fetch_data("reset_key")
-
-            now = datetime.now()
-            minutes = now.minute - reset_key["datetime"].minute - (now.month < reset_key["datetime"])
-            if minutes >= 5:
-                return JSONResponse(status_code=400, content={"error": "Session expired, request another one"})
-
-            else:
-                if change_key == reset_key["reset_key"]:
-                    user_data = {
-                        "psw": new_password
-                    }
-
-                    user = db.collection("users").document(self.uuid)
-                    if not user.get().exists:
-                        return JSONResponse(status_code=404, content={"error": "Invalid user ID"})
-
-                    user.update(user_data)
-                    return {"status": "success"}
+            user = db.collection("users").document(self.uuid)
+            user.update({"psw": hash_password(new_password_unsafe)})
+            user_cache.invalidate(self.uuid)
+            return {"status": "success"}
 
+        except NotFound:
+            return JSONResponse(status_code=404, content={"error": "Invalid user ID"})
         except Exception as e:
             return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -738,6 +776,10 @@ class Admin:
             return JSONResponse(status_code=404, content={"error": "Invalid admin ID"})
 
         user.update(user_data)
+        admin_cache.invalidate(self.uuid)
+        notify_admin_changed(self.uuid)
+        if not self.isActive or self.probation:
+            admin_sessions.revoke(self.uuid)
         return {"status": "success", "admindata": user_data}
 
     def add_admin(self):
@@ -754,11 +796,14 @@ class Admin:
         }
 
         try:
-            existing_admin = db.collection("admins").where(field_path="email", op_string="==", value=self.email).get()
-            if existing_admin:
+            if lookup_email(ADMIN_EMAIL_INDEX, self.email) is not None:
+                return {"error" :"Email already registered"}
+
+            if not register_email(ADMIN_EMAIL_INDEX, self.email, db.collection("admins").document(self.uuid), user_data):
                 return {"error" :"Email already registered"}
 
-            db.collection("admins").document(self.uuid).set(user_data)
+            admin_cache.invalidate(self.uuid)
+            notify_admin_changed(self.uuid)
             return {"status": "success"}
         except Exception as e:
             raise HTTPException(status_code=500, detail=e)
@@ -782,18 +827,18 @@ class Admin:
 
     def from_login(self, form: AdminLoginForm):
 
-        query = db.collection("admins").where(field_path="email", op_string="==", value=form.email).get()
-        if not query:
+        uuid = lookup_email(ADMIN_EMAIL_INDEX, form.email)
+        if uuid is None:
             raise HTTPException(status_code=404, detail={"error": "Invalid email, please apply with this email or contact an admin to help resolve the issue"})
 
-        admin_data = query[0].to_dict()
+        admin_data = load_profile(admin_cache, "admins", uuid, fresh=True)
         if admin_data is None:
             raise HTTPException(status_code=404, detail={"error": "Admin data not found"})
 
         if not verify_password(form.psw, admin_data["psw"]):
             raise HTTPException(status_code=400, detail={"error": "Incorrect password"})
 
-        self.uuid = query[0].id
+        self.uuid = uuid
         self.username = admin_data["username"]
         self.email = admin_data["email"]
         self.psw = admin_data["psw"]
@@ -806,7 +851,11 @@ class Admin:
 
         self.update_db()
 
-        return self.fetch_admindata().model_dump()
+        return {
+            **self.fetch_admindata().model_dump(),
+            "token": admin_sessions.issue(self.uuid, self.role, self.probation),
+            "token_expires_in": admin_sessions.ttl
+        }
 
     def from_userdata(self, admindata: AdminData, should_update: bool = False):
         self.uuid = admindata.id
@@ -824,11 +873,7 @@ class Admin:
 
     def fromUUID(self, uuid: str):
         self.uuid = uuid
-        query = db.collection("admins").document(self.uuid).get()
-        if not query:
-            raise HTTPException(status_code=404, detail={"error": "Invalid admin ID"})
-
-        admin = query.to_dict()
+        admin = load_profile(admin_cache, "admins", self.uuid)
         if admin is None:
             raise HTTPException(status_code=404, detail={"error": "Admin data not found"})
         
@@ -0,0 +1,194 @@
+# app/core/votes.py
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+from app.core.cache import TTLCache
+from app.core.db import db
+from typing import Dict, Optional, Tuple
+import os
+import threading
+import time
+
+VOTE_FLUSH_INTERVAL_MS = int(os.getenv("VOTE_FLUSH_INTERVAL_MS", 2000))
+VOTE_FLUSH_MAX_EVENTS = int(os.getenv("VOTE_FLUSH_MAX_EVENTS", 200))
+# How long stop() keeps retrying the final flush before giving up on the remaining votes
+VOTE_SHUTDOWN_TIMEOUT = float(os.getenv("VOTE_SHUTDOWN_TIMEOUT", 10))
+# Vote counts shown to voters are read from Firestore at most once per document and field per TTL
+VOTE_COUNT_TTL = float(os.getenv("VOTE_COUNT_TTL", 30))
+VOTE_COUNT_CACHE_SIZE = int(os.getenv("VOTE_COUNT_CACHE_SIZE", 4096))
+MAX_BATCH_WRITES = 500
+
+class VoteBuffer:
+    """
+    Write-behind buffer for forum votes. Votes are summed per document and field
+    and written as firestore.Increment updates in one batch, either every
+    `interval_ms` or as soon as `max_events` votes are waiting. On stop, the
+    final flush is retried for up to `shutdown_timeout` seconds.
+
+    The count returned for a vote is a base read from Firestore, plus this
+    process's votes that had not been written yet at the time, plus the votes
+    added since. The base is kept for `count_ttl` seconds, so repeat votes on
+    a document need no read.
+    """
+
+    def __init__(self, interval_ms: int, max_events: int, shutdown_timeout: float, count_ttl: float, count_cache_size: int):
+        self.interval = interval_ms / 1000
+        self.max_events = max_events
+        self.shutdown_timeout = shutdown_timeout
+        self.events = 0
+        self.flushed_events = 0
+        self.writes = 0
+        self.dropped = 0
+        self.lost = 0
+        self._pending: Dict[str, Tuple[object, Dict[str, int]]] = {}
+        # What the current flush took from _pending, until its writes have landed
+        self._flushing: Dict[str, Tuple[object, Dict[str, int]]] = {}
+        self._pending_events = 0
+        # (path, field): [count when read, votes added since]
+        self._counts = TTLCache(maxsize=count_cache_size, ttl=count_ttl)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, ref, field: str, stored: int, amount: int = 1) -> int:
+        """
+        Buffer a vote on a document whose `field` was just read as `stored`;
+        return the count including every vote not yet written.
+        """
+        with self._lock:
+            self._buffer(ref, field, amount)
+            count = stored + self._unflushed(ref.path, field)
+            self._counts.set((ref.path, field), [count, 0])
+            return count
+
+    def add_cached(self, ref, field: str, amount: int = 1) -> Optional[int]:
+        """
+        Buffer a vote and return the count if a recent base count is known;
+        otherwise buffer nothing and return None, and the caller reads the
+        document and calls add().
+        """
+        with self._lock:
+            entry = self._counts.get((ref.path, field))
+            if entry is None:
+                return None
+
+            self._buffer(ref, field, amount)
+            entry[1] += amount
+            return entry[0] + entry[1]
+
+    def _buffer(self, ref, field: str, amount: int):
+        self._merge(ref, {field: amount})
+        self.events += 1
+        if self._pending_events >= self.max_events:
+            self._wake.set()
+
+    def _unflushed(self, path: str, field: str) -> int:
+        return sum(entries[path][1].get(field, 0) for entries in (self._pending, self._flushing) if path in entries)
+
+    def _merge(self, ref, deltas: Dict[str, int]) -> Dict[str, int]:
+        _, counts = self._pending.setdefault(ref.path, (ref, {}))
+        for field, amount in deltas.items():
+            counts[field] = counts.get(field, 0) + amount
+            self._pending_events += amount
+
+        return counts
+
+    def flush(self):
+        with self._lock:
+            self._flushing = self._pending
+            pending = list(self._pending.values())
+            self._pending = {}
+            self._pending_events = 0
+
+        try:
+            self._write(pending)
+        finally:
+            with self._lock:
+                self._flushing = {}
+
+    def _write(self, pending):
+        for start in range(0, len(pending), MAX_BATCH_WRITES):
+            chunk = pending[start:start + MAX_BATCH_WRITES]
+            batch = db.batch()
+            for ref, counts in chunk:
+                batch.update(ref, {field: firestore.Increment(amount) for field, amount in counts.items()})
+
+            try:
+                batch.commit()
+                self._record(chunk)
+            except Exception:
+                # One deleted document fails the whole batch, so retry entry by entry
+                for ref, counts in chunk:
+                    self._write_one(ref, counts)
+
+    def _write_one(self, ref, counts: Dict[str, int]):
+        try:
+            ref.update({field: firestore.Increment(amount) for field, amount in counts.items()})
+            self._record([(ref, counts)])
+        except NotFound:
+            with self._lock:
+                self.dropped += sum(counts.values())
+        except Exception as e:
+            print(f"Error flushing votes for {ref.path}: {e}")
+            with self._lock:
+                self._merge(ref, counts)
+
+    def _record(self, written):
+        with self._lock:
+            self.writes += len(written)
+            self.flushed_events += sum(sum(counts.values()) for _, counts in written)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="vote-buffer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        delay = 0.25
+        self.flush()
+        while self._pending and time.monotonic() + delay < deadline:
+            time.sleep(delay)
+            delay *= 2
+            self.flush()
+
+        if self._pending:
+            with self._lock:
+                lost = sum(abs(amount) for _, counts in self._pending.values() for amount in counts.values())
+                documents = len(self._pending)
+                self._pending = {}
+                self._pending_events = 0
+            self.lost += lost
+            print(f"Lost {lost} buffered votes on {documents} documents: final flush failed for {self.shutdown_timeout}s")
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "pending": self._pending_events,
+            "writes": self.writes,
+            "writes_saved": self.flushed_events - self.writes,
+            "dropped": self.dropped,
+            "lost": self.lost
+        }
+
+vote_buffer = VoteBuffer(
+    interval_ms=VOTE_FLUSH_INTERVAL_MS,
+    max_events=VOTE_FLUSH_MAX_EVENTS,
+    shutdown_timeout=VOTE_SHUTDOWN_TIMEOUT,
+    count_ttl=VOTE_COUNT_TTL,
+    count_cache_size=VOTE_COUNT_CACHE_SIZE
+)
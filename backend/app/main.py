@@ -1,11 +1,40 @@
 # app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from app.core import mc
+from app.core.board import admin_board
+from app.core.codes import code_store
+from app.core.executor import configure_blocking_pool, run_blocking
+from app.core.mail import mail_outbox
+from app.core.images import ImmutableStaticFiles, PUBLIC_DIR, image_store
+from app.core.hashing import bcrypt_pool
+from app.core.ratelimit import RateLimitMiddleware, rate_limiter
+from app.core.sessions import admin_sessions
+from app.core.utils import profile_cache_stats
+from app.core.votes import vote_buffer
 from app.routers import admin, cart, forums, login, register
 
-app = FastAPI(title="SurfNetwork API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_blocking_pool()
+    await run_blocking(mc.log_archive.start)
+    await run_blocking(mc.warm_log_index)
+    vote_buffer.start()
+    admin_sessions.start()
+    mail_outbox.start()
+    yield
+    mail_outbox.stop()
+    admin_sessions.stop()
+    # Retries the final flush with sleeps, so keep it off the loop
+    await run_blocking(vote_buffer.stop)
+    bcrypt_pool.shutdown()
+    mc.log_archive.stop()
+
+app = FastAPI(title="SurfNetwork API", lifespan=lifespan)
+
+# Added before CORS so that CORS wraps it and 429s still carry CORS headers
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,12 +51,31 @@ app.include_router(login.router)
 app.include_router(register.router)
 app.include_router(mc.router)
 
-app.mount("/public", StaticFiles(directory="public"), name="public")
+app.mount("/public", ImmutableStaticFiles(directory=PUBLIC_DIR), name="public")
 
 @app.get("/health-check")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "profile_cache": profile_cache_stats(),
+        "votes": vote_buffer.stats(),
+        "bcrypt": bcrypt_pool.stats(),
+        "admin_sessions": admin_sessions.stats(),
+        "admin_board": admin_board.stats(),
+        "images": image_store.stats(),
+        "mail_outbox": mail_outbox.stats(),
+        "codes": code_store.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "plugin": mc.bridge.stats(),
+        "plugin_cache": mc.plugin_cache.stats(),
+        "log_broadcast": mc.log_broadcaster.stats(),
+        "log_archive": mc.log_archive.stats(),
+        "log_index": mc.log_index.stats()
+    }
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the SurfNetwork API"}
@@ -1,7 +1,7 @@
 # app/models/admin_models.py
 
 from pydantic import BaseModel, EmailStr
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
 class AdminData(BaseModel):
@@ -16,7 +16,7 @@ class AdminData(BaseModel):
     probation: bool = False
 
 class AdminMessageSubmission(BaseModel):
-    admin_id: str
+    admin_id: Optional[str] = None
     message: str
     time: datetime
 
@@ -26,6 +26,7 @@ class ForumMessage(BaseModel):
     likes: int = 0
     dislikes: int = 0
     replies: list
+    more_replies: int = 0
 
 class Forum(BaseModel):
     id: str
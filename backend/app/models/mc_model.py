@@ -0,0 +1,14 @@
+# app/models/mc_model.py
+
+from pydantic import BaseModel
+from typing import Optional, List
+
+class PluginAction(BaseModel):
+    action: str
+    player: Optional[str] = None
+    command: Optional[str] = None
+    new_data: Optional[dict] = None
+
+class PluginBatch(BaseModel):
+    admin_id: Optional[str] = None
+    actions: List[PluginAction]
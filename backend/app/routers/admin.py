@@ -1,10 +1,16 @@
 # app/routers/admin.py
 
-from fastapi import APIRouter
-from typing import Any, Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import RedirectResponse
+from typing import Optional
+from app.core.auth import require_admin
+from app.core.board import admin_board, avatar_path
 from app.core.db import db
+from app.core.executor import run_blocking
+from app.core.images import image_store
+from app.core.sessions import admin_sessions
 from app.models.admin_models import AdminLoginForm, AdminRegisterForm, AdminMessageSubmission
-from app.core.utils import Admin, verify_admin, get_admin_code, set_admin_code, time_elasped_string, image_to_dataurl, load_image_from_path
+from app.core.utils import Admin, get_admin_code, set_admin_code
 import threading
 import random
 
@@ -21,78 +27,49 @@ def admin_register(form: AdminRegisterForm):
     return admin.from_register(form)
 
 @router.get(path="/admin/get-messages", response_model=dict)
-def get_admin_message():
-    pages = []
-    pageCount = 0
+def get_admin_message(request: Request):
+    body, etag = admin_board.get()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
 
-    docs = db.collection("admin_messages").stream()
-    for doc in docs:
-        if verify_admin(doc.id) is True:
-            obj = doc.to_dict()
-            print(obj)
-            admin = Admin()
-            admin.fromUUID(doc.id)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-            time_str = time_elasped_string(obj.get("time"))
+@router.get(path="/admin/avatar/{admin_id}")
+def get_admin_avatar(admin_id: str, size: Optional[int] = None):
+    avatar = image_store.publish(avatar_path(admin_id))
+    if avatar is None:
+        raise HTTPException(status_code=404, detail={"error": "Image not found"})
 
-            def badge(titles: List[str]) -> List[Dict[str, str]]:
-                badges = []
-                for title in titles:
-                    badge = {"content": title, "badgeType": "success"}
-                    match title:
-                        case "owner":
-                            badge["badgeType"] = "danger"
-                        case "dev":
-                            badge["badgeType"] = "danger"
-                        case "admin":
-                            badge["badgeType"] = "primary"
-                        case "moderator":
-                            badge["badgeType"] = "primary"
+    # The hashed URL is cached forever by browsers; this redirect is not
+    return RedirectResponse(avatar.get(str(size), avatar["original"]), headers={"Cache-Control": "no-cache"})
 
-                    badges.append(badge)
-
-                return badges
-
-            print(f"admin_{doc.id}.png")
-            
-            page = {
-                "name": admin.fetch_admindata().username,
-                "badges": badge(admin.fetch_admindata().badges),
-                "imageSource": image_to_dataurl(load_image_from_path(f"admin_{doc.id}.png")),
-                "assentColor": admin.fetch_admindata().color,
-                "playerDetail": admin.fetch_admindata().role,
-                "messageContent": obj.get("message"),
-                "timeDiff": time_str
-            }
-            pageCount += 1
-            pages.append(page)
+@router.put(path="/admin/add-message", response_model=dict)
+async def add_admin_message(admin_message: AdminMessageSubmission, request: Request):
+    admin_id = await require_admin(request, admin_message.admin_id)
 
-    return {"page": pages, "pageCount": pageCount}
+    message = {
+        "message": admin_message.message,
+        "time": admin_message.time
+    }
 
-@router.put(path="/admin/add-message", response_model=dict)
-def add_admin_message(admin_message: AdminMessageSubmission):
-    if verify_admin(admin_message.admin_id) is True:
-        admin = Admin()
-        admin.fromUUID(admin_message.admin_id)
-        
-        message = {
-            "message": admin_message.message,
-            "time": admin_message.time
-        }
-        
-        try:
-            db.collection("admin_messages").document(admin_message.admin_id).set(message)
-            return {"message": "Message added successfully"}
-        except Exception as e:
-            return {"error": str(e)}
-    else:
-        return {"error": "Invalid admin ID"}
+    try:
+        await run_blocking(db.collection("admin_messages").document(admin_id).set, message)
+        admin_board.invalidate()
+        return {"message": "Message added successfully"}
+    except Exception as e:
+        return {"error": str(e)}
 
 @router.get(path="/admin/get-admin-code")
-def get_code(admin_id: str):
-    if verify_admin(admin_id) is True:
-        code = get_admin_code()
-        return {"admin_code": code}
+def get_code(admin_id: str = Depends(require_admin)):
+    code = get_admin_code()
+    return {"admin_code": code}
+
+@router.post(path="/admin/logout", response_model=dict)
+def admin_logout(admin_id: str = Depends(require_admin)):
+    # Ends every session this admin holds, on all workers once they refresh
+    admin_sessions.revoke(admin_id)
+    return {"status": "success"}
 
 # Note: The admin registration endpoint is protected by an admin code for security.
 # Ensure to provide the correct admin code in registration requests.
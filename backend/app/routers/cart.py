@@ -1,10 +1,11 @@
 # app/routers/cart.py
 
-from fastapi import APIRouter, HTTPException, Request, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request, BackgroundTasks, Query
 from pydantic import BaseModel
 from app.core.db import db
+from app.core.executor import run_blocking
 from app.core.mc import send_request_to_plugin, get_playername, get_playerid
-from app.core.utils import User
+from app.core.utils import User, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate
 from app.models.cart_model import Product, CartList, CheckoutRequest
 from typing import List, Optional
 import random
@@ -44,12 +45,10 @@ def put_into_cart(cart_id: str, cart_list: CartList):
     return {"message", "Added to cart"}
 
 @router.get(path="/products", response_model=dict)
-def list_products():
-    docs = db.collection("products").stream()
-    if docs is None:
-        raise HTTPException(status_code=404, detail={"error": "No products found"})
+def list_products(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None):
+    docs, next_cursor = paginate(db.collection("products"), ["category", "name"], limit, after)
     products = [doc.to_dict() for doc in docs]
-    return {"products": products}
+    return {"products": products, "next": next_cursor}
 
 @router.put(path="/products/add", response_model=dict)
 def add_product(item: Product):
@@ -64,12 +63,12 @@ def add_product(item: Product):
 @router.post("/checkout", response_model=dict)
 async def create_checkout(data: CheckoutRequest):
     user = User()
-    user.fromUUID(data.user_id)
+    await run_blocking(user.fromUUID, data.user_id)
     userdata = user.fetch_userdata()
-    username = get_playername(user)
+    username = await get_playername(user)
     uuid = get_playerid(user)
 
-    cart : List[Product] = get_cart(data.cart_id)
+    cart : List[Product] = await run_blocking(get_cart, data.cart_id)
 
     payload = {
         "baasket": {
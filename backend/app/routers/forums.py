@@ -1,15 +1,20 @@
 # app/routers/forums.py
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from firebase_admin import firestore
 from app.core.db import db
-from app.core.utils import User, generate_uuid, time_elasped_string
+from app.core.forum_store import FORUMS_COLLECTION, TOPICS_COLLECTION, REPLIES_COLLECTION, category_ref, topics_ref, replies_ref
+from app.core.votes import vote_buffer
+from app.core.utils import UNKNOWN_USERNAME, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, generate_uuid, paginate, resolve_usernames, time_elasped_string
 from app.models.forum_model import Forum, ForumMessage, ForumSubmission, ForumReplySubmission
 from datetime import datetime
-import uuid
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 router = APIRouter()
 
+# Deeper branches are loaded on demand through /fetch-forum/{category_name}/{forum_id}/replies/{reply_id}
+MAX_REPLY_DEPTH = 64
+
 @router.put(path="/submit-forum", response_model=dict)
 def submit_forum(forum_submission: ForumSubmission):
     forum_data = Forum(
@@ -22,19 +27,26 @@ def submit_forum(forum_submission: ForumSubmission):
     )
 
     try:
-        doc = db.collection("forums").document(forum_submission.category).get()
-        category = doc.to_dict() or {"topics": [], "replies": []}
-        topics : List[Dict[str, Any]]  = category.get("topics") or []
-
-        for topic in topics:
-            if (topic.get("title") == forum_submission.title and 
-                topic.get("author") == forum_submission.user_id):
-                raise HTTPException(status_code=400, detail={"error": "Duplicate forum submission detected."})
-
-        topics.append(forum_data.dict())
-        category["topics"] = topics
-        db.collection("forums").document(forum_submission.category).set(category)
+        topics = topics_ref(forum_submission.category)
+        duplicate = (topics
+            .where(field_path="author", op_string="==", value=forum_submission.user_id)
+            .where(field_path="topic", op_string="==", value=forum_submission.title)
+            .limit(1)
+            .get())
+        if duplicate:
+            raise HTTPException(status_code=400, detail={"error": "Duplicate forum submission detected."})
+
+        topic = forum_data.dict(exclude={"replies"})
+        topic["category"] = forum_submission.category
+        topic["reply_count"] = 0
+
+        batch = db.batch()
+        batch.set(topics.document(forum_data.id), topic)
+        batch.set(category_ref(forum_submission.category), {"name": forum_submission.category, "topic_count": firestore.Increment(1)}, merge=True)
+        batch.commit()
         return {"message": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
@@ -45,142 +57,167 @@ def submit_forum_reply(forum_reply_submission: ForumReplySubmission):
         parent_id = forum_reply_submission.parent_id,
         author = forum_reply_submission.user_id,
         content = forum_reply_submission.content,
-        time = datetime.now(),
+        time = datetime.now().isoformat(),
         replies = []
     )
 
     try:
-        doc = db.collection("forums").document(forum_reply_submission.category).get()
-        category = doc.to_dict() or {"topics": [], "replies": []}
-        replies_list: List[Dict[str, Any]] = category.get("replies", []) or []
-        topics : List[Dict[str, Any]] = category.get("topics") or []
-
-        for reply in replies_list:
-            if (reply.get("parent_id") == forum_reply_submission.parent_id and
-                reply.get("author") == forum_reply_submission.user_id and
-                reply.get("content") == forum_reply_submission.content):
-                raise HTTPException(status_code=400, detail={"error": "Duplicate forum reply detected."})
-
-            if (reply.get("id") == forum_reply_submission.parent_id):
-                reply["replies"].append(fetch_forum.id)
-
-        for topic in topics:
-            if (topic.get("id") == forum_reply_submission.parent_id):
-                topic["replies"].append(forum_reply.id)
-
-        replies_list.append(forum_reply.dict())
-        category["replies"] = replies_list
-        category["topics"] = topics
-        db.collection("forums").document(forum_reply_submission.category).set(category)
+        topics = topics_ref(forum_reply_submission.category)
+        replies = replies_ref(forum_reply_submission.category)
+        parent_id = forum_reply_submission.parent_id
+
+        # The parent is either the topic itself or another reply in its thread
+        parents = {snapshot.reference.parent.id: snapshot for snapshot in db.get_all([topics.document(parent_id), replies.document(parent_id)])}
+        if parents[TOPICS_COLLECTION].exists:
+            topic_id = parent_id
+        elif parents[REPLIES_COLLECTION].exists:
+            topic_id = parents[REPLIES_COLLECTION].get("topic_id")
+        else:
+            raise HTTPException(status_code=404, detail={"error": f"Parent id '{parent_id}' not found in category '{forum_reply_submission.category}'"})
+
+        duplicate = (replies
+            .where(field_path="parent_id", op_string="==", value=parent_id)
+            .where(field_path="author", op_string="==", value=forum_reply_submission.user_id)
+            .where(field_path="content", op_string="==", value=forum_reply_submission.content)
+            .limit(1)
+            .get())
+        if duplicate:
+            raise HTTPException(status_code=400, detail={"error": "Duplicate forum reply detected."})
+
+        reply = forum_reply.dict(exclude={"replies"})
+        reply["topic_id"] = topic_id
+
+        batch = db.batch()
+        batch.set(replies.document(forum_reply.id), reply)
+        batch.update(topics.document(topic_id), {"reply_count": firestore.Increment(1)})
+        batch.commit()
         return {"message": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail={"error": str(e)})
 
 @router.get(path="/fetch-forum", response_model=dict)
 def fetch_forum():
     forum_content = {}
-    categories = {}
-    docs = db.collection("forums").stream()
-
-    def parse_category(categories: Dict[str, Any], category_name: str) -> Any:
-        category = categories.get(category_name, {"topics": []})
-        topics: List[Dict[str, Any]] = category.get("topics", []) or []
-        parsed_topics = []
-
-        for topic in topics:
-            user = User()
-            user.fromUUID(str(topic.get("author")))
-            topic["author"] = user.fetch_userdata().username
-            topic["time"] = time_elasped_string(_format_time(topic.get("time")))
-            topic["replies"] = len(topic.get("replies"))
-            parsed_topics.append(topic)
-
-        return parsed_topics
-
-    for doc in docs:
-        categories[doc.id] = doc.to_dict()
-        forum_content[doc.id] = parse_category(categories, doc.id)
-    
+    topics = {}
+    for category in db.collection(FORUMS_COLLECTION).stream():
+        forum_content[category.id] = []
+        topics[category.id] = [doc.to_dict() for doc in topics_ref(category.id).stream()]
+
+    usernames = resolve_usernames(topic.get("author") for category in topics.values() for topic in category)
+    for name, category in topics.items():
+        category.sort(key=lambda topic: _time_key(topic.get("time")))
+        forum_content[name] = _parse_topics(category, usernames)
+
     return forum_content
 
 @router.get(path="/fetch-forum/{category_name}", response_model=dict)
-def fetch_forum_category(category_name: str):
-    pages = fetch_forum().get(category_name, [])
-        
-    return {"pages": pages}
+def fetch_forum_category(category_name: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None):
+    docs, next_cursor = paginate(topics_ref(category_name), ["time"], limit, after)
+    topics = [doc.to_dict() for doc in docs]
+    usernames = resolve_usernames(topic.get("author") for topic in topics)
 
-@router.get(path="/fetch-forum/{category_name}/{forum_id}", response_model=dict)
-def fetch_forum_category(category_name: str, forum_id: str):
-    doc = db.collection("forums").document(category_name).get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail=f"Category '{category_name}' not found")
+    return {"pages": _parse_topics(topics, usernames), "next": next_cursor}
 
-    category = doc.to_dict() or {}
-    topics: List[Dict[str, Any]] = category.get("topics", []) or []
-    replies_list: List[Dict[str, Any]] = category.get("replies", []) or []
+def _parse_topics(topics: List[Dict[str, Any]], usernames: Dict[str, str]) -> List[Dict[str, Any]]:
+    parsed_topics = []
 
-    topic = next((t for t in topics if str(t.get("id")) == str(forum_id)), None)
-    if topic is None:
-        raise HTTPException(status_code=404, detail={"error": f"Forum id '{forum_id}' not found in category '{category_name}'"})
+    for topic in topics:
+        topic["author"] = usernames.get(str(topic.get("author")), UNKNOWN_USERNAME)
+        topic["time"] = time_elasped_string(_format_time(topic.get("time")))
+        topic["replies"] = topic.pop("reply_count", 0)
+        parsed_topics.append(topic)
 
-    replies_by_id: Dict[str, Dict[str, Any]] = {}
-    children_map: Dict[str, List[Dict[str, Any]]] = {}
+    return parsed_topics
 
-    for r in replies_list:
-        rid = str(r.get("id"))
-        replies_by_id[rid] = r.copy()
-        parent = r.get("parent_id")
-        if parent is None:
-            parent_key = "root"
-        else:
-            parent_key = str(parent)
-        
-        children_map.setdefault(parent_key, []).append(r)
-
-    def build_reply_tree(reply_obj: ForumMessage) -> ForumMessage:
-        rid = str(reply_obj.get("id"))
-
-        user = User()
-        user.fromUUID(str(reply_obj.get("author")))
-
-        node = ForumMessage(
-            id = rid,
-            parent_id = reply_obj.get("parent_id"),
-            author = user.fetch_userdata().username,
-            content = reply_obj.get("content"),
-            time = time_elasped_string(_format_time(reply_obj.get("time"))),
-            likes = reply_obj.get("likes", 0),
-            dislikes = reply_obj.get("dislikes", 0),
-            replies = []
-        )
-
-        children = children_map.get(rid, [])
-        children_sorted = sorted(children, key=lambda x: (_to_datetime(x.get("time")) or datetime.fromtimestamp(0)))
-        for child in children_sorted:
-            node.replies.append(build_reply_tree(child))
-        return node
-
-    user = User()
-    user.fromUUID(str(topic.get("author")))
+@router.get(path="/fetch-forum/{category_name}/{forum_id}", response_model=dict)
+def fetch_forum_category(category_name: str, forum_id: str, depth: int = Query(MAX_REPLY_DEPTH, ge=1, le=MAX_REPLY_DEPTH)):
+    doc = topics_ref(category_name).document(forum_id).get()
+    if not doc.exists:
+        raise HTTPException(status_code=404, detail={"error": f"Forum id '{forum_id}' not found in category '{category_name}'"})
+
+    topic = doc.to_dict() or {}
+    replies, nodes = _build_reply_tree(_load_thread(category_name, forum_id), str(forum_id), depth)
+    usernames = resolve_usernames([topic.get("author")] + [node.author for node in nodes])
+    for node in nodes:
+        node.author = usernames.get(node.author, UNKNOWN_USERNAME)
 
     forum_page = Forum(
         id = str(topic.get("id")),
         topic = topic.get("topic"),
-        author = user.fetch_userdata().username,
+        author = usernames.get(str(topic.get("author")), UNKNOWN_USERNAME),
         content = topic.get("content"),
         time = time_elasped_string(_format_time(topic.get("time"))),
         likes = topic.get("likes", 0),
         dislikes = topic.get("dislikes", 0),
-        replies = []
+        replies = replies
     )
 
-    root_children = children_map.get(str(forum_id), [])
-    root_sorted = sorted(root_children, key=lambda x: (_to_datetime(x.get("time")) or datetime.fromtimestamp(0)))
-    for r in root_sorted:
-        forum_page.replies.append(build_reply_tree(r))
-
     return {"forum_page": forum_page}
 
+@router.get(path="/fetch-forum/{category_name}/{forum_id}/replies/{reply_id}", response_model=dict)
+def fetch_forum_replies(category_name: str, forum_id: str, reply_id: str, depth: int = Query(MAX_REPLY_DEPTH, ge=1, le=MAX_REPLY_DEPTH)):
+    children_map = _load_thread(category_name, forum_id)
+    if not any(str(reply.get("id")) == reply_id for children in children_map.values() for reply in children):
+        raise HTTPException(status_code=404, detail={"error": f"Reply id '{reply_id}' not found in forum '{forum_id}'"})
+
+    replies, nodes = _build_reply_tree(children_map, reply_id, depth)
+    usernames = resolve_usernames(node.author for node in nodes)
+    for node in nodes:
+        node.author = usernames.get(node.author, UNKNOWN_USERNAME)
+
+    return {"replies": replies}
+
+def _load_thread(category_name: str, forum_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    # Replies of one thread grouped by parent id, each group already in time order
+    replies = [doc.to_dict() for doc in replies_ref(category_name).where(field_path="topic_id", op_string="==", value=forum_id).stream()]
+    replies.sort(key=lambda reply: _time_key(reply.get("time")))
+
+    children_map: Dict[str, List[Dict[str, Any]]] = {}
+    for reply in replies:
+        children_map.setdefault(str(reply.get("parent_id")), []).append(reply)
+
+    return children_map
+
+def _build_reply_tree(children_map: Dict[str, List[Dict[str, Any]]], root_id: str, depth: int = MAX_REPLY_DEPTH):
+    """
+    Build the reply tree under root_id without recursion. Nodes at the depth limit
+    keep an empty reply list and report how many direct replies were left out.
+    Authors are left as user ids so the caller can resolve them in one batch.
+    """
+    roots: List[ForumMessage] = []
+    nodes: List[ForumMessage] = []
+    stack = [(root_id, roots, 1)]
+
+    while stack:
+        parent_id, siblings, level = stack.pop()
+        for reply in children_map.get(parent_id, []):
+            node = ForumMessage(
+                id = str(reply.get("id")),
+                parent_id = reply.get("parent_id"),
+                author = str(reply.get("author")),
+                content = reply.get("content"),
+                time = time_elasped_string(_format_time(reply.get("time"))),
+                likes = reply.get("likes", 0),
+                dislikes = reply.get("dislikes", 0),
+                replies = []
+            )
+            siblings.append(node)
+            nodes.append(node)
+
+            if node.id in children_map:
+                if level >= depth:
+                    node.more_replies = len(children_map[node.id])
+                else:
+                    stack.append((node.id, node.replies, level + 1))
+
+    return roots, nodes
+
+def _time_key(val) -> float:
+    dt = _to_datetime(val)
+    return dt.timestamp() if dt is not None else 0.0
+
 def _to_datetime(val):
     if val is None:
         return None
@@ -207,102 +244,41 @@ def _format_time(val):
     dt = _to_datetime(val)
     return dt.isoformat() if dt is not None else None
 
-@router.put(path="/fetch-forum/{category_name}/{forum_id}/like", response_model=dict)
-def like_forum(category_name: str, forum_id: str):
-    doc = db.collection("forums").document(category_name).get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail=f"Category '{category_name}' not found")
-
-    category = doc.to_dict() or {}
-    topics: List[Dict[str, Any]] = category.get("topics", []) or []
+def _add_vote(ref, field: str, not_found: str) -> int:
+    # Votes are buffered and flushed as batched increments by vote_buffer; the document
+    # is read only when its count is not already known
+    count = vote_buffer.add_cached(ref, field)
+    if count is not None:
+        return count
 
-    topic = next((t for t in topics if str(t.get("id")) == str(forum_id)), None)
-    if topic is None:
-        raise HTTPException(status_code=404, detail={"error": f"Forum id '{forum_id}' not found in category '{category_name}'"})
+    doc = ref.get(field_paths=[field])
+    if not doc.exists:
+        raise HTTPException(status_code=404, detail={"error": not_found})
 
-    current_likes = topic.get("likes", 0) or 0
+    current = (doc.to_dict() or {}).get(field, 0) or 0
     try:
-        current_likes = int(current_likes)
+        current = int(current)
     except Exception:
-        current_likes = 0
+        current = 0
 
-    topic["likes"] = current_likes + 1
-    category["topics"] = topics
-    db.collection("forums").document(category_name).set(category)
+    return vote_buffer.add(ref, field, current)
 
-    return {"message": "success", "likes": topic["likes"]}
+@router.put(path="/fetch-forum/{category_name}/{forum_id}/like", response_model=dict)
+def like_forum(category_name: str, forum_id: str):
+    likes = _add_vote(topics_ref(category_name).document(forum_id), "likes", f"Forum id '{forum_id}' not found in category '{category_name}'")
+    return {"message": "success", "likes": likes}
 
 @router.put(path="/fetch-forum/{category_name}/{reply_id}/like-reply", response_model=dict)
 def like_reply(category_name: str, reply_id: str):
-    doc = db.collection("forums").document(category_name).get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail=f"Category '{category_name}' not found")
-
-    category = doc.to_dict() or {}
-    replies: List[Dict[str, Any]] = category.get("replies", []) or []
-
-    reply = next((t for t in replies if str(t.get("id")) == str(reply_id)), None)
-    if reply is None:
-        raise HTTPException(status_code=404, detail={"error": f"Reply id '{reply_id}' not found in category '{category_name}'"})
+    likes = _add_vote(replies_ref(category_name).document(reply_id), "likes", f"Reply id '{reply_id}' not found in category '{category_name}'")
+    return {"message": "success", "likes": likes}
 
-    current_likes = reply.get("likes", 0) or 0
-    try:
-        current_likes = int(current_likes)
-    except Exception:
-        current_likes = 0
-
-    reply["likes"] = current_likes + 1
-    category["replies"] = replies
-    db.collection("forums").document(category_name).set(category)
-
-    return {"message": "success", "likes": reply["likes"]}
-    
 @router.put(path="/fetch-forum/{category_name}/{forum_id}/dislike", response_model=dict)
 def dislike_forum(category_name: str, forum_id: str):
-    doc = db.collection("forums").document(category_name).get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail=f"Category '{category_name}' not found")
-
-    category = doc.to_dict() or {}
-    topics: List[Dict[str, Any]] = category.get("topics", []) or []
-
-    topic = next((t for t in topics if str(t.get("id")) == str(forum_id)), None)
-    if topic is None:
-        raise HTTPException(status_code=404, detail={"error": f"Forum id '{forum_id}' not found in category '{category_name}'"})
-
-    current_dislikes = topic.get("dislikes", 0) or 0
-    try:
-        current_dislikes = int(current_dislikes)
-    except Exception:
-        current_dislikes = 0
-
-    topic["dislikes"] = current_dislikes + 1
-    category["topics"] = topics
-    db.collection("forums").document(category_name).set(category)
-
-    return {"message": "success", "dislikes": topic["dislikes"]}
+    dislikes = _add_vote(topics_ref(category_name).document(forum_id), "dislikes", f"Forum id '{forum_id}' not found in category '{category_name}'")
+    return {"message": "success", "dislikes": dislikes}
 
 @router.put(path="/fetch-forum/{category_name}/{reply_id}/dislike-reply", response_model=dict)
 def dislike_reply(category_name: str, reply_id: str):
-    doc = db.collection("forums").document(category_name).get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail=f"Category '{category_name}' not found")
-
-    category = doc.to_dict() or {}
-    replies: List[Dict[str, Any]] = category.get("replies", []) or []
-
-    reply = next((t for t in replies if str(t.get("id")) == str(reply_id)), None)
-    if reply is None:
-        raise HTTPException(status_code=404, detail={"error": f"Reply id '{reply_id}' not found in category '{category_name}'"})
-
-    current_dislikes = reply.get("dislikes", 0) or 0
-    try:
-        current_dislikes = int(current_dislikes)
-    except Exception:
-        current_dislikes = 0
-
-    reply["dislikes"] = current_dislikes + 1
-    category["replies"] = replies
-    db.collection("forums").document(category_name).set(category)
-
-    return {"message": "success", "dislikes": reply["dislikes"]}
\ No newline at end of file
+    dislikes = _add_vote(replies_ref(category_name).document(reply_id), "dislikes", f"Reply id '{reply_id}' not found in category '{category_name}'")
+    return {"message": "success", "dislikes": dislikes}
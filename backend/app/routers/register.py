@@ -2,17 +2,18 @@
 
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
+from app.core.codes import CODE_EXPIRED, CODE_OK, code_store
+from app.core.executor import run_blocking
 from app.core.utils import User
 from app.models.util_model import UserData
 from app.models.user_model import RegisterForm
-from datetime import datetime
 
 router = APIRouter()
 
 @router.post(path="/register/ppsecure", response_model=UserData)
 async def register_user(form: RegisterForm):
     new_user = User()
-    status = new_user.from_register(form)
+    status = await run_blocking(new_user.from_register, form)
     if status == "success":
         return new_user.fetch_userdata()
     else:
@@ -28,17 +29,13 @@ def request_confirm_email(user_id: str):
 def confirm_email(user_id: str, email_code: int):
     user = User()
     userdata = user.fromUUID(user_id)
-    code = user.fetch_data("email_codes")
 
-    now = datetime.now()
-    minutes = now.minute - code["datetime"].minute - (now.second < code["datetime"].second)
-    if minutes >= 5:
+    result = code_store.consume("confirm_email", user_id, str(email_code))
+    if result == CODE_EXPIRED:
         return {"status": "Code expired, request another one"}
-    
-    else:
-        if code["digits"] == email_code:
-            userdata.confirm_email = True
-            return user.from_userdata(userdata, True)
 
-        else:
-            return {"error": "Invalid code"}
\ No newline at end of file
+    if result == CODE_OK:
+        userdata.confirm_email = True
+        return user.from_userdata(userdata, True)
+
+    return {"error": "Invalid code"}
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Never reach Mailjet from a benchmark
+os.environ["MAIL_TRANSPORT"] = "memory"
+os.environ.setdefault("MAIL_OUTBOX_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_mail_"), "unused.sqlite3"))
+
+from app.core.email_templates import CONFIRM_EMAIL, code_boxes
+from app.core.mail import build_message, render_html_email
+from app.core.outbox import MailOutbox
+from app.core.transports import HttpTransport
+
+# Same layout as the confirm email, built as a block tree the way callers used to
+def legacy_blocks(code: int) -> list:
+    return [
+        {"type": "table", "content": [{"type": "table", "content": [
+            {"type": "header", "content": "Verify Your Email Address"},
+            {"type": "text", "content": "We just need to verify your email address to activate your SurfNetwork account. Here's your verification code:"},
+            {"type": "html", "content": code_boxes(code)},
+            {"type": "html", "content": "This code expires within 5 minutes"},
+            {"type": "text", "content": "Welcome aboard!"}
+        ]}]},
+        {"type": "table", "content": [{"type": "text", "content": "© 2025 SurfNetwork"}]}
+    ]
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+    if not values:
+        return {}
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1]}
+
+def fmt(stats: dict, unit: str, scale: float) -> str:
+    return "  ".join(f"{name}={value * scale:.1f}{unit}" for name, value in stats.items())
+
+class FakeMailApi(BaseHTTPRequestHandler):
+    """
+    Answers like Mailjet's v3.1 send endpoint and records when each message arrived.
+    """
+    latency = 0.0
+    received: list = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        now = time.perf_counter()
+        with self.lock:
+            for message in body["Messages"]:
+                self.received.append(now - float(message["CustomID"]))
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        payload = json.dumps({"Messages": [{"Status": "success"} for _ in body["Messages"]]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def bench_render(iterations: int):
+    legacy, compiled = [], []
+    for i in range(iterations):
+        code = 100000 + i % 900000
+        start = time.perf_counter()
+        render_html_email(legacy_blocks(code))
+        legacy.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        CONFIRM_EMAIL.render(code_html=code_boxes(code))
+        compiled.append(time.perf_counter() - start)
+
+    print(f"render legacy    {fmt(percentiles(legacy), 'us', 1e6)}")
+    print(f"render template  {fmt(percentiles(compiled), 'us', 1e6)}")
+
+    html, images = CONFIRM_EMAIL.render(code_html=code_boxes(123456))
+    message = build_message("player@example.com", "Player", "Verify your email - SurfNetwork", html, images)
+    print(f"payload          {len(json.dumps(message))} bytes per message")
+
+def bench_queue(messages: int, batch_size: int, latency_ms: float):
+    FakeMailApi.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMailApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    outbox = MailOutbox(
+        path=os.path.join(tempfile.mkdtemp(prefix="bench_mail_"), "outbox.sqlite3"),
+        sender=HttpTransport(f"http://127.0.0.1:{server.server_port}/v3.1/send").send,
+        batch_size=batch_size,
+        interval=0.05,
+        max_attempts=3,
+        backoff=0.1,
+        max_backoff=1,
+        lease=30
+    )
+    outbox.start()
+
+    enqueue_times = []
+    started = time.perf_counter()
+    for i in range(messages):
+        html, images = CONFIRM_EMAIL.render(code_html=code_boxes(100000 + i))
+        message = build_message(f"player{i}@example.com", f"Player {i}", "Verify your email - SurfNetwork", html, images)
+        message["CustomID"] = str(time.perf_counter())
+        start = time.perf_counter()
+        outbox.enqueue(message)
+        enqueue_times.append(time.perf_counter() - start)
+    enqueued = time.perf_counter() - started
+
+    while len(FakeMailApi.received) < messages and outbox.stats()["dead"] == 0:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    outbox.stop()
+    server.shutdown()
+
+    print(f"enqueue          {messages / enqueued:.0f} msg/s  {fmt(percentiles(enqueue_times), 'us', 1e6)}")
+    print(f"delivered        {len(FakeMailApi.received)}/{messages} in {elapsed:.2f}s ({len(FakeMailApi.received) / elapsed:.0f} msg/s, {outbox.batches} batches)")
+    print(f"end-to-end       {fmt(percentiles(FakeMailApi.received), 'ms', 1e3)}")
+
+# Usage: python bench_mail.py [--messages N] [--batch-size N] [--latency-ms MS] [--render-iterations N]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mail render and outbox throughput benchmark against a local fake mail API")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated mail API response time")
+    parser.add_argument("--render-iterations", type=int, default=10000)
+    args = parser.parse_args()
+
+    bench_render(args.render_iterations)
+    bench_queue(args.messages, args.batch_size, args.latency_ms)
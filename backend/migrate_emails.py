@@ -0,0 +1,17 @@
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.core.utils import ADMIN_EMAIL_INDEX, USER_EMAIL_INDEX, backfill_email_index
+
+# Run once before deploying the email index: logins and registrations treat an unindexed address as unknown.
+# Usage: python migrate_emails.py [--dry-run]
+if __name__ == "__main__":
+    dry_run = "--dry-run" in sys.argv[1:]
+
+    for index, collection in ((USER_EMAIL_INDEX, "users"), (ADMIN_EMAIL_INDEX, "admins")):
+        report = backfill_email_index(index, collection, dry_run=dry_run)
+        print(f"{collection}: {report['added']} addresses indexed, {len(report['conflicts'])} conflicts")
+        for email, account_id, indexed_id in report["conflicts"]:
+            print(f"  {email}: account {account_id} not indexed, address already belongs to {indexed_id}")
@@ -0,0 +1,30 @@
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.core.db import db
+from app.core.forum_store import FORUMS_COLLECTION, category_ref, migrate_category, tag_topic_categories
+
+# Usage: python migrate_forums.py [--dry-run] [category ...]
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    names = [arg for arg in args if arg != "--dry-run"]
+
+    if names:
+        snapshots = [category_ref(name).get() for name in names]
+    else:
+        snapshots = db.collection(FORUMS_COLLECTION).stream()
+
+    for snapshot in snapshots:
+        if not snapshot.exists:
+            print(f"{snapshot.id}: not found")
+            continue
+
+        report = migrate_category(snapshot, dry_run=dry_run)
+        if report.get("skipped"):
+            tagged = tag_topic_categories(snapshot.id, dry_run=dry_run)
+            print(f"{report['category']}: already migrated, {tagged} topics tagged with their category")
+        else:
+            print(f"{report['category']}: {report['topics']} topics, {report['replies']} replies, {len(report['orphans'])} orphaned replies {report['orphans']}")
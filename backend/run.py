@@ -6,4 +6,6 @@ load_dotenv()
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5729))
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
+    # WebSocket protocol pings: a plugin that misses them for 3 intervals is disconnected
+    heartbeat = float(os.getenv("MC_HEARTBEAT_INTERVAL", 15))
+    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True, ws_ping_interval=heartbeat, ws_ping_timeout=heartbeat * 2)
\ No newline at end of file